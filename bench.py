@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import generate
+import grade
+import judge
+import show
+
+
+# Parameters of the generated instances of each task, by size
+SWEEPS = {
+    "dh": lambda size: dict(programs=10 * size, libraries=5 * size, versions=4),
+    "statues": lambda size: dict(length=8 * size),
+    "blocks-simple": lambda size: dict(n_blocks=4 * size, towers=2),
+    "blocks-multi": lambda size: dict(n_blocks=4 * size, towers=2, arms=2),
+    "coffee-single": lambda size: dict(hallways=size, deliveries=size),
+    "coffee-multi": lambda size: dict(hallways=size, deliveries=size, agents=2),
+}
+GENERATORS: Dict[str, Callable[..., generate.Files]] = {
+    "dh": generate.dependency_hell,
+    "statues": generate.statues,
+    "blocks-simple": generate.blocks,
+    "blocks-multi": generate.blocks,
+    "coffee-single": generate.coffee,
+    "coffee-multi": generate.coffee,
+}
+# Phases summed over the tests of an instance
+PHASES = ["spawn", "ground", "solve", "parse", "validate", "cache"]
+
+
+parser = argparse.ArgumentParser(
+    description="Grade generated instances of growing sizes with a reference solution."
+)
+parser.add_argument(
+    "--reference",
+    required=True,
+    help="Directory of the reference solution, with the same layout as an assignment.",
+)
+parser.add_argument(
+    "--tasks",
+    nargs="+",
+    choices=SWEEPS.keys(),
+    default=["dh", "statues", "blocks-simple", "coffee-single"],
+)
+parser.add_argument("--sizes", nargs="+", type=int, default=[1, 2, 3])
+parser.add_argument("--seeds", type=int, default=1, help="Instances of each size.")
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=1,
+    help="Number of clingo runs to execute concurrently, more skews their times.",
+)
+parser.add_argument(
+    "--backend",
+    choices=judge.BACKENDS.keys(),
+    default="subprocess",
+)
+parser.add_argument(
+    "--work_dir",
+    help="Keep the generated instances and their results here, a temporary directory otherwise.",
+)
+parser.add_argument(
+    "--output", default="bench.json", help="Where to write the results."
+)
+parser.add_argument(
+    "--baseline",
+    help="Results of an earlier run to compare with, from its --output.",
+)
+
+
+def instance_results(instance: judge.Instance) -> Dict[str, Any]:
+    results = instance.test_results
+    tests = {
+        Path(test).name: {
+            "status": str(run["status"]),
+            "time": run["time"],
+            "verified": run["verified"],
+            "phases": run.get("phases", dict()),
+            "statistics": run.get("statistics", dict()),
+        }
+        for kind in ["positive_tests", "negative_tests"]
+        for (test, run) in results[kind].items()
+    }
+    phases = {
+        phase: sum(test["phases"].get(phase, 0) for test in tests.values())
+        for phase in PHASES
+    }
+    phases["write"] = results["write_time"]
+    return {
+        "passed": results["passed"],
+        # Instances wait for each other's runs, their work is measured apart
+        "instance_time": results["instance_time"],
+        "total": sum(test["time"] for test in tests.values())
+        + phases["validate"]
+        + phases["write"],
+        "phases": phases,
+        "tests": tests,
+    }
+
+
+def run(args, work_dir: Path) -> Dict[str, List[Dict[str, Any]]]:
+    tasks = {task.output_name: task for task in grade.TASKS}
+    reference = Path(args.reference)
+    output_path = work_dir / "test_results"
+    for name in ["passed", "failed"]:
+        (output_path / name).mkdir(parents=True, exist_ok=True)
+
+    instances = []
+    for task_name in args.tasks:
+        task = tasks[task_name]
+        for size in args.sizes:
+            for seed in range(args.seeds):
+                params = SWEEPS[task_name](size)
+                instance_dir = work_dir / task_name / "{}-{}".format(size, seed)
+                generate.write_instance(
+                    instance_dir, GENERATORS[task_name](seed=seed, **params)
+                )
+                instance_class = grade.JUDGES[task.judge]
+                show_file = show.write_show_file(
+                    output_path / "show" / (task_name + ".lp"),
+                    instance_class.validator_class,
+                )
+                instance = instance_class(
+                    instance_dir=instance_dir,
+                    assignment_path=reference,
+                    output_path=output_path,
+                    is_single_agent=task.single_agent,
+                    base_files=[f.format(assignment=reference) for f in task.base_files]
+                    + [show_file],
+                    output_name=task_name,
+                    backend=args.backend,
+                )
+                instances.append((task_name, size, seed, params, instance))
+
+    results: Dict[str, List[Dict[str, Any]]] = {task: [] for task in args.tasks}
+    with judge.executor(args.jobs) as pool:
+        for (_, _, _, _, instance) in instances:
+            instance.submit(pool)
+        for (task_name, size, seed, params, instance) in instances:
+            instance.test()
+            results[task_name].append(
+                dict(size=size, seed=seed, params=params, **instance_results(instance))
+            )
+    return results
+
+
+def report(results, baseline=None):
+    """Prints the time of each phase, and the change from `baseline`."""
+    print(
+        "{:<14} {:>4} {:>4} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            "task", "size", "seed", "ground", "solve", "validate", "write", "total"
+        )
+    )
+    for (task_name, runs) in results.items():
+        earlier = dict()
+        if baseline is not None:
+            earlier = {
+                (r["size"], r["seed"]): r
+                for r in baseline["results"].get(task_name, [])
+            }
+        for r in runs:
+            line = "{:<14} {:>4} {:>4} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f}".format(
+                task_name,
+                r["size"],
+                r["seed"],
+                r["phases"]["ground"],
+                r["phases"]["solve"],
+                r["phases"]["validate"],
+                r["phases"]["write"],
+                r["total"],
+            )
+            if (r["size"], r["seed"]) in earlier:
+                before = earlier[(r["size"], r["seed"])]["total"]
+                line += "  x{:.2f}".format(r["total"] / before if before else 0)
+            if not r["passed"]:
+                line += "  (failed)"
+            print(line)
+
+
+def main():
+    args = parser.parse_args()
+
+    t0 = time.time()
+    if args.work_dir is not None:
+        results = run(args, Path(args.work_dir))
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run(args, Path(work_dir))
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "version": judge.BACKEND_VERSIONS[args.backend](),
+                "backend": args.backend,
+                "jobs": args.jobs,
+                "time": time.time() - t0,
+                "results": results,
+            },
+            f,
+        )
+    print("Wrote `{}`".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,49 @@
 #!/usr/bin/env python
 
 import os
-import re
 
 from pathlib import Path
+from typing import Dict, Set
 
 import judge
 
-from logging import LogLevel
+from log import LogLevel
 from strips import StripsValidator
+from validator import handles, parse_term
 
 
-INSTANCES_PATH = judge.INSTANCES_PATH
-OUTPUT_PATH = judge.OUTPUT_PATH
+class Towers:
+    """Blocks-world state, updated move by move.
 
+    Keeps where each block is (`on`) and what's directly over each block
+    (`above`), so both questions take constant time.
+    """
 
-# Parse expressions
-ARM = re.compile(r"^arm\((?P<name>.*)\)$")
-BLOCK = re.compile(r"^block\((?P<name>.*)\)$")
+    __slots__ = ["on", "above"]
 
-F_ON = re.compile(r"^on\((?P<a>\w+),(?P<b>\w+)\)$")
+    def __init__(self):
+        self.on: Dict[str, str] = dict()
+        # Conflicting moves may leave more than one block over another one.
+        self.above: Dict[str, Set[str]] = dict()
 
-A_EXT_MOVE = re.compile(r"^(?P<src>.*),(?P<dst>.*),(?P<extra>.*)$")
-A_MOVE = re.compile(r"^(?P<src>.*),(?P<dst>.*)$")
+    def place(self, a, b):
+        """`a` is now over `b` (and not over the older block/table)."""
+        if (old := self.on.get(a)) is not None:
+            self.above[old].discard(a)
+        self.on[a] = b
+        self.above.setdefault(b, set()).add(a)
 
-
-def over(dest, on):
-    """Returns the item directly over of the destination"""
-    if dest == "table":
+    def over(self, dest):
+        """Returns the item directly over of the destination"""
+        if dest == "table":
+            return None
+        if blocks := self.above.get(dest):
+            return min(blocks)
         return None
-    for a, b in on.items():
-        if dest == b:
-            return a
-    return None
 
 
-def check_safe_move(t, arm, a, b, on, logs):
-    if (blocking := over(a, on)) is not None:
+def check_safe_move(t, arm, a, b, towers, logs):
+    if (blocking := towers.over(a)) is not None:
         # `blocking` is over `a`
         logs.append(
             (
@@ -51,7 +58,7 @@ def check_safe_move(t, arm, a, b, on, logs):
         # It's always ok to move things to the table.
         return
 
-    if (blocking := over(b, on)) is not None:
+    if (blocking := towers.over(b)) is not None:
         # `blocking` is over `b`
         logs.append(
             (
@@ -64,23 +71,25 @@ def check_safe_move(t, arm, a, b, on, logs):
 
 
 class BlocksValidator(StripsValidator):
-    def __init__(self, solution):
-        super().__init__(solution)
+    __slots__ = ["arm", "blocks"]
+
+    # The goal is checked on the `Towers` after the plan.
+    SIMULATE_GOAL = False
+    STATIC_ATTRIBUTES = StripsValidator.STATIC_ATTRIBUTES + ["arm", "blocks"]
 
+    def __init__(self, solution, context=None):
         self.arm: Set[str] = set()
         self.blocks: Set[str] = set()
 
-        for pred in self.solution:
-            skipped = False
-            if (m := ARM.search(pred)) is not None:
-                self.arm.add(m.group("name"))
-            elif (m := BLOCK.search(pred)) is not None:
-                self.blocks.add(m.group("name"))
-            else:
-                skipped = True
-            if not skipped:
-                if pred not in self.parsed_predicates:
-                    self.parsed_predicates.add(pred)
+        super().__init__(solution, context)
+
+    @handles("arm", 1, static=True)
+    def parse_arm(self, name):
+        self.arm.add(name)
+
+    @handles("block", 1, static=True)
+    def parse_block(self, name):
+        self.blocks.add(name)
 
     def verify(self):
         logs = super().verify()
@@ -88,13 +97,12 @@ class BlocksValidator(StripsValidator):
             logs = []
 
         # Simulation
-        on: Dict[str, str] = dict()
+        towers = Towers()
 
         for f in self.start:
-            if (m := F_ON.search(f)) is not None:
-                a = m.group("a")
-                b = m.group("b")
-                on[a] = b
+            (name, args) = parse_term(f)
+            if name == "on" and len(args) == 2:
+                towers.place(*args)
 
         for t, instant_plan in enumerate(self.plan):
             # Check
@@ -111,7 +119,7 @@ class BlocksValidator(StripsValidator):
                     )
 
                 for action in actions:
-                    if (m := A_EXT_MOVE.search(action.args)) is not None:
+                    if len(action.arguments) > 2:
                         logs.append(
                             (
                                 LogLevel.INFO,
@@ -120,16 +128,17 @@ class BlocksValidator(StripsValidator):
                                 ),
                             )
                         )
-                    elif (m := A_MOVE.search(action.args)) is not None:
-                        a = m.group("src")
-                        b = m.group("dst")
+                    elif len(action.arguments) == 2:
+                        (a, b) = action.arguments
                         moves[a] = b
-                        check_safe_move(t, agent, a, b, on, logs)
+                        check_safe_move(t, agent, a, b, towers, logs)
                     else:
                         logs.append(
                             (
                                 LogLevel.WARNING,
-                                "`move/2` should be the only action. Can't parse '{}'".format(action),
+                                "`move/2` should be the only action. Can't parse '{}'".format(
+                                    action
+                                ),
                             )
                         )
 
@@ -162,39 +171,33 @@ class BlocksValidator(StripsValidator):
 
             # Execute actions from this instant. (even under errors)
             for a, b in moves.items():
-                # `a` is now over `b` (and not over the older block/table).
-                on[a] = b
                 assert a != "table"
+                towers.place(a, b)
+
+        for f in self.goal:
+            (name, args) = parse_term(f)
+            if name != "on" or len(args) != 2:
+                continue
+            (a, b) = args
+            if towers.on.get(a) != b:
+                logs.append(
+                    (
+                        LogLevel.ERROR,
+                        "The goal {} isn't reached at t={}, {} is on {}.".format(
+                            f, len(self.execs), a, towers.on.get(a, "nothing")
+                        ),
+                    )
+                )
 
         return logs
 
 
 class BlocksWorldInstance(judge.Instance):
-    def verify(self, solution):
-        v = BlocksValidator(solution)
-        return {
-            "instance_summary": v.instance_summary(sep="\n" + " "*26),
-            "valid": len(solution) > 0 and v.is_valid(),
-            "logs": "\n                 > ".join(v.coloured_logs()),
-        }
+    validator_class = BlocksValidator
 
 
 def main():
-    OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
-    print("Output path: ", OUTPUT_PATH)
-
-    for instance_dir in sorted(
-        [INSTANCES_PATH / p.name for p in INSTANCES_PATH.glob("*/")]
-    ):
-        instance = BlocksWorldInstance(
-            instance_dir=instance_dir,
-            assignment_path=judge.ASSIGNMENT_PATH,
-            output_path=OUTPUT_PATH,
-            is_single_agent=judge.SINGLE_AGENT,
-        )
-
-        instance.test()
-        print(instance.results_str())
+    judge.main(BlocksWorldInstance)
 
 
 if __name__ == "__main__":
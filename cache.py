@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import clingo
+from symbols import intern_atoms
+
+
+# Outcomes that depend on the load of the machine, or on errors, are not kept.
+# Interrupted runs (`timeout`) aren't kept either, even with models.
+UNCACHED_STATUSES = [
+    clingo.Status.TIMEOUT,
+    clingo.Status.UNKNOWN,
+    clingo.Status.MEMOUT,
+]
+
+
+class ResultCache:
+    """Raw clingo results, addressed by the contents of their inputs.
+
+    Results are stored as `<cache_dir>/<task>/<key>.json`, where `key` hashes
+    the clingo version, the exact arguments, the contents of every file in
+    them and the settings of the run that change its results. The least
+    recently used results are evicted once the cache is over `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        # File hashes, by (path, modification time, size)
+        self.file_hashes: Dict[Tuple[str, int, int], str] = dict()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = sum(p.stat().st_size for p in self.cache_dir.rglob("*.json"))
+
+    def file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        file_key = (path, stat.st_mtime_ns, stat.st_size)
+        if file_key not in self.file_hashes:
+            with open(path, "rb") as f:
+                self.file_hashes[file_key] = hashlib.sha256(f.read()).hexdigest()
+        return self.file_hashes[file_key]
+
+    def key(
+        self,
+        version: str,
+        exec_args: List[str],
+        timeout: float,
+        settings: Dict[str, Any] = dict(),
+    ) -> str:
+        h = hashlib.sha256()
+        h.update(
+            json.dumps(
+                [version, [str(a) for a in exec_args], timeout, settings],
+                sort_keys=True,
+            ).encode()
+        )
+        for arg in exec_args:
+            if os.path.isfile(arg):
+                h.update(self.file_hash(str(arg)).encode())
+        return h.hexdigest()
+
+    def path(self, task: str, key: str) -> Path:
+        return self.cache_dir / task / (key + ".json")
+
+    def get(self, task: str, key: str) -> Optional[Dict[str, Any]]:
+        t0 = time.time()
+        path = self.path(task, key)
+        try:
+            with open(path) as f:
+                results = json.load(f)
+            # Mark as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        results["status"] = clingo.Status[results["status"]]
+        results["solutions"] = [intern_atoms(atoms) for atoms in results["solutions"]]
+        # Nothing ran, the time went to reading the results
+        results["phases"] = {"cache": time.time() - t0}
+        return results
+
+    def put(self, task: str, key: str, results: Dict[str, Any]):
+        if results["status"] in UNCACHED_STATUSES or results["timeout"]:
+            return
+
+        path = self.path(task, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(dict(results, status=results["status"].name))
+
+        # Write and rename, so concurrent readers never see partial results.
+        tmp_path = path.with_suffix(".tmp{}".format(threading.get_ident()))
+        with open(tmp_path, "w") as f:
+            f.write(data)
+
+        with self.lock:
+            # Concurrent runs of the same test replace each other's results
+            try:
+                replaced_size = path.stat().st_size
+            except OSError:
+                replaced_size = 0
+            os.replace(tmp_path, path)
+            self.size += len(data) - replaced_size
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Removes the least recently used results, down to 90% of `max_bytes`."""
+        entries = sorted(
+            [
+                (p.stat().st_mtime, p.stat().st_size, p)
+                for p in self.cache_dir.rglob("*.json")
+            ]
+        )
+        self.size = sum(size for (_, size, _) in entries)
+        for (_, size, path) in entries:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self.size -= size
+
+    def invalidate(self, task: str):
+        """Removes all the results of `task`."""
+        with self.lock:
+            shutil.rmtree(self.cache_dir / task, ignore_errors=True)
+            self.size = sum(p.stat().st_size for p in self.cache_dir.rglob("*.json"))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import clingo_api
+
+
+# Predicates of the instances, by the files of an assignment that shouldn't
+# define them.
+INSTANCE_PREDICATES: Dict[str, List[Tuple[str, int]]] = {
+    "csat/dep_hell/dh.lp": [("program", 1), ("version", 2)],
+    "planning/statues/statues.lp": [("isRed", 1)],
+    "planning/blocks/blocks.lp": [("block", 1)],
+    "planning/blocks/blocks-multiagent.lp": [("block", 1)],
+    "planning/coffee/coffee.lp": [("connected", 3)],
+    "planning/coffee/coffee-multiagent.lp": [("connected", 3)],
+}
+
+
+parser = argparse.ArgumentParser(
+    description="Find instances hardcoded into the models of the assignments."
+)
+parser.add_argument(
+    "assignment_dirs",
+    nargs="+",
+    help="Directories containing the assignments to check.",
+)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=1,
+    help="Number of assignments to check concurrently.",
+)
+parser.add_argument(
+    "--output",
+    default="hardcoded.json",
+    help="Where to write the findings, by assignment and file.",
+)
+
+
+def nodes(node) -> Iterator[Any]:
+    """`node` and everything under it on the AST."""
+    yield node
+    for key in node.child_keys:
+        child = getattr(node, key)
+        if child is None:
+            continue
+        if isinstance(child, clingo_api.pyclingo.ast.AST):
+            yield from nodes(child)
+        else:
+            for element in child:
+                yield from nodes(element)
+
+
+def hardcoded_atoms(statement, predicates: List[Tuple[str, int]]) -> List[str]:
+    """Predicates of the ground atoms the head of `statement` defines."""
+    ast = clingo_api.pyclingo.ast
+    if statement.ast_type != ast.ASTType.Rule:
+        return []
+
+    found = []
+    for node in nodes(statement.head):
+        if node.ast_type != ast.ASTType.SymbolicAtom:
+            continue
+        terms = [node.symbol]
+        if node.symbol.ast_type == ast.ASTType.Pool:
+            terms = list(node.symbol.arguments)
+        for term in terms:
+            if term.ast_type != ast.ASTType.Function:
+                continue
+            if (term.name, len(term.arguments)) not in predicates:
+                continue
+            if any(n.ast_type == ast.ASTType.Variable for n in nodes(term)):
+                continue
+            found.append("{}/{}".format(term.name, len(term.arguments)))
+    return found
+
+
+def check_file(path: Path, predicates: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    """Statements of `path` that define facts of `predicates`.
+
+    Files that don't exist or don't parse have none, the judges report them.
+    """
+    findings: List[Dict[str, Any]] = []
+
+    def on_statement(statement):
+        for predicate in sorted(set(hardcoded_atoms(statement, predicates))):
+            findings.append(
+                {
+                    "line": statement.location.begin.line,
+                    "predicate": predicate,
+                    "statement": str(statement),
+                }
+            )
+
+    if not path.is_file():
+        return []
+    try:
+        clingo_api.pyclingo.ast.parse_files(
+            [str(path)], on_statement, logger=lambda _code, _message: None
+        )
+    except RuntimeError:
+        return []
+    return findings
+
+
+def check_assignment(assignment_dir: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Findings of each file of the assignment that has any."""
+    report = dict()
+    for (name, predicates) in INSTANCE_PREDICATES.items():
+        findings = check_file(Path(assignment_dir) / name, predicates)
+        if findings:
+            report[name] = findings
+    return report
+
+
+def main():
+    args = parser.parse_args()
+    if not clingo_api.available():
+        parser.error("checking the assignments needs clingo's python module")
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        reports = list(pool.map(check_assignment, args.assignment_dirs))
+
+    report = dict()
+    for (assignment_dir, findings) in zip(args.assignment_dirs, reports):
+        report[Path(assignment_dir).name] = findings
+        for (name, file_findings) in findings.items():
+            for finding in file_findings:
+                print(
+                    "{}:{}:{}".format(
+                        Path(assignment_dir) / name,
+                        finding["line"],
+                        finding["statement"],
+                    )
+                )
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(
+        "{} of {} assignments hardcode instances, wrote `{}`".format(
+            sum(1 for findings in report.values() if findings),
+            len(report),
+            args.output,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
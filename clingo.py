@@ -1,11 +1,40 @@
-from typing import Dict, Optional, List
+from typing import Deque, Dict, Optional, List
+import functools
+import math
+import os
+import re
+import resource
+import signal
 import subprocess
+import threading
 import time
 
+from collections import deque
 from enum import Enum
+from symbols import intern_atoms
 
 
 DEFAULT_TIMEOUT = 20  # 20s
+# clingo stops itself on `--time-limit`, it's only killed if it takes longer.
+KILL_GRACE = 5  # 5s
+
+# Bounds on what's kept from each run, for `MODELS=0` tests and huge models.
+MAX_MODELS = 100
+MAX_MODEL_BYTES = 16 * 1024 * 1024  # 16MiB
+TAIL_LINES = 200
+MAX_TAIL_LINE = 1000
+
+# `--stats` summary, e.g. `Time : 0.153s (Solving: 0.05s 1st Model: 0.00s ...)`
+STATS_TIME = re.compile(r"^Time\s*:\s*([0-9.]+)s\s*\(Solving:\s*([0-9.]+)s")
+# `--stats` counters, e.g. `Conflicts : 229 (Analyzed: 228)`, by their key on results
+STATS_COUNT = re.compile(r"^(Atoms|Rules|Choices|Conflicts|Restarts)\s*:\s*([0-9]+)")
+STATISTICS = {
+    "Atoms": "atoms",
+    "Rules": "rules",
+    "Choices": "choices",
+    "Conflicts": "conflicts",
+    "Restarts": "restarts",
+}
 
 
 def read_answers(clingo_output):
@@ -33,6 +62,7 @@ class Status(Enum):
     UNKNOWN = -1
     TIMEOUT = -2
     SYNTAX_ERROR = -3
+    MEMOUT = -4
 
     @staticmethod
     def from_status_code(clingo_status_code: int):
@@ -57,6 +87,9 @@ class Status(Enum):
         # 31: Run interrupted: Program is consistent / some optima found
         elif clingo_status_code == 31:
             return Status.SATISFIABLE
+        # 33: Run interrupted: Out of memory
+        elif clingo_status_code == 33:
+            return Status.MEMOUT
         # 62: Program is consistent / all possible optima found
         elif clingo_status_code == 62:
             return Status.SATISFIABLE
@@ -69,68 +102,302 @@ class Status(Enum):
         return Status.UNKNOWN
 
 
+def solver_flags(
+    models: int = 1, constants: Optional[Dict] = None, project: bool = False
+) -> List[str]:
+    project_flags = []
+    if project:
+        project_flags = ["--project"]
+    constant_flags = []
+    if constants:
+        for key, value in constants.items():
+            constant_flags.append("--const")
+            constant_flags.append("{}={}".format(key, value))
+
+    return ["--models={}".format(models)] + project_flags + constant_flags
+
+
+def command(
+    args: List[str],
+    base_files: List[str] = [],
+    models: int = 1,
+    constants: Optional[Dict] = None,
+    time_limit: Optional[int] = None,
+    stats: bool = False,
+    project: bool = False,
+) -> List[str]:
+    limit_flags = []
+    if time_limit is not None:
+        limit_flags = ["--time-limit={}".format(time_limit)]
+    if stats:
+        limit_flags.append("--stats")
+    return (
+        ["clingo"]
+        + limit_flags
+        + solver_flags(models, constants, project)
+        + base_files
+        + args
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def version() -> str:
+    """First line of `clingo --version`, e.g. `clingo version 5.5.0`."""
+    try:
+        x = subprocess.run(["clingo", "--version"], capture_output=True, text=True)
+    except OSError:
+        return ""
+    return x.stdout.split("\n", maxsplit=1)[0]
+
+
+def _drain(pipe, tail: Deque[str]):
+    for line in pipe:
+        tail.append(_tail_line(line))
+
+
+def _tail_line(line: str) -> str:
+    line = line.rstrip("\n")
+    if len(line) > MAX_TAIL_LINE:
+        return line[:MAX_TAIL_LINE] + " ..."
+    return line
+
+
+def _limit(
+    process: subprocess.Popen,
+    memory_limit: Optional[int] = None,
+    cpu_limit: Optional[float] = None,
+):
+    """Limits the resources of a process that just started.
+
+    `preexec_fn` isn't safe with threads, so the limits are set from outside
+    right after starting clingo. It gets `KILL_GRACE` seconds over `cpu_limit`
+    to stop before it's killed.
+    """
+    try:
+        if memory_limit is not None:
+            limit = memory_limit * 1024 * 1024
+            resource.prlimit(process.pid, resource.RLIMIT_AS, (limit, limit))
+        if cpu_limit is not None:
+            limit = math.ceil(cpu_limit)
+            resource.prlimit(
+                process.pid, resource.RLIMIT_CPU, (limit, limit + KILL_GRACE)
+            )
+    except ProcessLookupError:
+        # It's already done
+        pass
+
+
+def _wait(process: subprocess.Popen):
+    """Waits for `process` like `process.wait()`, returns its resource usage."""
+    try:
+        _pid, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already waited for
+        process.wait()
+        return None
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return rusage
+
+
 def run(
     args: List[str],
     base_files: List[str] = [],
-    timeout: int = DEFAULT_TIMEOUT,
+    timeout: float = DEFAULT_TIMEOUT,
     models: int = 1,
     constants: Optional[Dict] = None,
+    memory_limit: Optional[int] = None,
+    cpu_limit: Optional[float] = None,
+    project: bool = False,
 ):
-    constant_flags = []
-    if constants:
-        for key, value in constants.items():
-            constant_flags.append("--const")
-            constant_flags.append("{}={}".format(key, value))
+    """Runs clingo, reading its models as they're printed.
 
+    clingo stops itself after `timeout` seconds (rounded up), keeping the models
+    found so far, and it's killed if it's still running `KILL_GRACE` seconds
+    later. Interrupted runs have `timeout` set and keep their models, they're
+    `TIMEOUT` unless all the `models` were found (and clingo wasn't
+    optimizing them).
+
+    Only the last `MAX_MODELS` models (and up to `MAX_MODEL_BYTES` of them) and
+    the last `TAIL_LINES` lines of stdout/stderr are kept, `truncated` tells if
+    some models were dropped. Once `models` models are found, clingo is
+    interrupted right away, unless it's optimizing.
+
+    `phases` has the seconds spent starting clingo (`spawn`), reading its
+    models (`parse`) and, from clingo's `--stats`, grounding (`ground`, which
+    includes parsing the programs) and solving (`solve`).
+
+    `statistics` has the size of the ground program (`atoms`, `rules`), the
+    search effort (`choices`, `conflicts`, `restarts`), the peak memory of
+    clingo, in KiB (`max_rss`) and its CPU time (`cpu_time`). Runs that are
+    killed only have the last two.
+
+    clingo's address space can be limited to `memory_limit` MiB, runs out of
+    memory are `MEMOUT` if they found no model. Its CPU time can be limited to
+    `cpu_limit` seconds, those runs are interrupted as with `timeout`.
+
+    With `project`, models are enumerated projected onto the `#project` atoms
+    of the program (the shown ones without any), so no two models are the
+    same on those.
+    """
     t0 = time.time()
-    exec_args = (
-        ["clingo"] + ["--models={}".format(models)] + constant_flags + base_files + args
+    exec_args = command(
+        args,
+        base_files,
+        models,
+        constants,
+        math.ceil(timeout),
+        stats=True,
+        project=project,
     )
     exec_args_str = [str(s) for s in exec_args]
 
-    try:
-        x = subprocess.run(
-            exec_args,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-        status = Status.from_status_code(x.returncode)
-        stdout_lines = list(x.stdout.splitlines())
-        stderr_lines = list(x.stderr.splitlines())
-
-        if status == Status.UNKNOWN:
-            print("returncode: ", x.returncode)
-            print("args: ", x.args)
-            print("stdout: ", stdout_lines)
-            print("stderr: ", stderr_lines)
-            raise Exception("Found unknown clingo status code.")
+    stdout_tail: Deque[str] = deque(maxlen=TAIL_LINES)
+    stderr_tail: Deque[str] = deque(maxlen=TAIL_LINES)
+    solutions: Deque[List[str]] = deque()
+    truncated = False
+    timed_out = threading.Event()
+    phases: Dict[str, float] = {"spawn": 0.0, "parse": 0.0}
+    statistics: Dict[str, int] = dict()
+
+    def result(status: Status, timeout: bool = False):
         return {
             "args": exec_args_str,
             "time": time.time() - t0,
-            "timeout": False,
+            "timeout": timeout,
             "status": status,
-            "solutions": [sol for sol in read_answers(stdout_lines)],
-            "stdout": stdout_lines,
-            "stderr": stderr_lines,
-        }
-    except subprocess.TimeoutExpired as to:
-        return {
-            "args": exec_args_str,
-            "time": time.time() - t0,
-            "timeout": True,
-            "status": Status.TIMEOUT,
-            "solutions": [],
-            "stdout": [],
-            "stderr": [],
-        }
-    except Exception as e:
-        return {
-            "args": exec_args_str,
-            "time": time.time() - t0,
-            "timeout": True,
-            "status": Status.UNKNOWN,
-            "solutions": [],
-            "stdout": [],
-            "stderr": [],
+            "solutions": list(solutions),
+            "truncated": truncated,
+            "stdout": list(stdout_tail),
+            "stderr": list(stderr_tail),
+            "phases": phases,
+            "statistics": statistics,
         }
+
+    try:
+        process = subprocess.Popen(
+            exec_args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    except Exception:
+        return result(Status.UNKNOWN, True)
+    phases["spawn"] = time.time() - t0
+    _limit(process, memory_limit, cpu_limit)
+    # Both were requested as pipes
+    assert process.stdout is not None and process.stderr is not None
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    stderr_thread = threading.Thread(
+        target=_drain, args=(process.stderr, stderr_tail), daemon=True
+    )
+    stderr_thread.start()
+    timer = threading.Timer(math.ceil(timeout) + KILL_GRACE, kill)
+    timer.start()
+    # Interrupted runs still print their stats, they're killed if they don't stop
+    stop_timer = threading.Timer(KILL_GRACE, process.kill)
+
+    found = 0
+    kept_bytes = 0
+    answer_line = False
+    stopped = False
+    time_limit = False
+    optimizing = False
+    try:
+        for line in process.stdout:
+            stdout_tail.append(_tail_line(line))
+            if answer_line:
+                answer_line = False
+                if stopped:
+                    continue
+                parse_t0 = time.time()
+                found += 1
+                solutions.append(intern_atoms(line.split()))
+                kept_bytes += len(line)
+                while len(solutions) > MAX_MODELS or (
+                    kept_bytes > MAX_MODEL_BYTES and len(solutions) > 1
+                ):
+                    kept_bytes -= sum(len(atom) + 1 for atom in solutions.popleft())
+                    truncated = True
+                phases["parse"] += time.time() - parse_t0
+                continue
+
+            if line.startswith("Answer: "):
+                answer_line = True
+                continue
+            if line.startswith("TIME LIMIT"):
+                time_limit = True
+            if line.startswith("Optimization:"):
+                optimizing = True
+            if line.startswith("Time") and (m := STATS_TIME.match(line)):
+                phases["solve"] = float(m.group(2))
+                phases["ground"] = round(
+                    max(0.0, float(m.group(1)) - phases["solve"]), 3
+                )
+            elif line[:1].isupper() and (m := STATS_COUNT.match(line)):
+                statistics[STATISTICS[m.group(1)]] = int(m.group(2))
+
+            # The line after a model tells if clingo is still optimizing.
+            if (
+                not stopped
+                and 0 < models <= found
+                and not line.startswith("Optimization:")
+            ):
+                stopped = True
+                process.send_signal(signal.SIGINT)
+                stop_timer.start()
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        rusage = _wait(process)
+        timer.cancel()
+        stop_timer.cancel()
+        stderr_thread.join()
+        process.stdout.close()
+        process.stderr.close()
+
+    if rusage is not None:
+        statistics["max_rss"] = rusage.ru_maxrss
+        statistics["cpu_time"] = rusage.ru_utime + rusage.ru_stime
+
+    if stopped:
+        return result(Status.SATISFIABLE)
+    # Interrupted runs only pass with all their models
+    complete = 0 < models <= found and not optimizing
+    if timed_out.is_set():
+        return result(Status.TIMEOUT, True)
+
+    # Over `cpu_limit`, clingo stops on SIGXCPU or gets killed
+    over_cpu_limit = (
+        cpu_limit is not None and statistics.get("cpu_time", 0) >= cpu_limit
+    )
+    # Out of memory, the executable exits with 33 and the python one with 65.
+    # Killed otherwise, it's most likely the OOM killer.
+    if not over_cpu_limit and (
+        process.returncode in [33, -signal.SIGKILL]
+        or any("bad_alloc" in line for line in stderr_tail)
+    ):
+        if complete:
+            return result(Status.SATISFIABLE, True)
+        return result(Status.MEMOUT)
+
+    # 1, 11 and 31: Run interrupted, with the models found so far, if any
+    if time_limit or over_cpu_limit or process.returncode in [1, 11, 31]:
+        if complete:
+            return result(Status.SATISFIABLE, True)
+        return result(Status.TIMEOUT, True)
+    status = Status.from_status_code(process.returncode)
+    if status == Status.UNKNOWN:
+        print("returncode: ", process.returncode)
+        print("args: ", exec_args_str)
+        print("stdout: ", list(stdout_tail))
+        print("stderr: ", list(stderr_tail))
+        return result(Status.UNKNOWN, True)
+    return result(status)
@@ -0,0 +1,328 @@
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import importlib
+import importlib.machinery
+import importlib.util
+import sys
+import time
+
+from collections import deque
+from pathlib import Path
+
+import clingo
+from clingo import DEFAULT_TIMEOUT, Status
+from symbols import intern_atoms
+
+
+def load_clingo_module():
+    """Loads clingo's python module, if it's installed.
+
+    The local `clingo.py` shadows the real module, so it's loaded from the rest
+    of the `sys.path` and registered as `pyclingo` instead.
+    """
+    if "pyclingo" in sys.modules:
+        return sys.modules["pyclingo"]
+
+    here = Path(__file__).resolve().parent
+    search_path = [p for p in sys.path if Path(p or ".").resolve() != here]
+    spec = importlib.machinery.PathFinder.find_spec("clingo", search_path)
+    if spec is None or spec.origin is None:
+        return None
+
+    alias = importlib.util.spec_from_file_location(
+        "pyclingo",
+        spec.origin,
+        submodule_search_locations=spec.submodule_search_locations,
+    )
+    module = importlib.util.module_from_spec(alias)
+    sys.modules["pyclingo"] = module
+    try:
+        alias.loader.exec_module(module)
+        importlib.import_module("pyclingo.ast")
+    except ImportError:
+        del sys.modules["pyclingo"]
+        return None
+    return module
+
+
+pyclingo = load_clingo_module()
+
+
+def available() -> bool:
+    return pyclingo is not None
+
+
+def version() -> str:
+    return "clingo python module {}".format(pyclingo.__version__)
+
+
+def parse_errors(path: str) -> List[str]:
+    """Messages of the parser on `path`, only if it doesn't parse.
+
+    The file is only parsed, not grounded, so it's much cheaper than a run.
+    Missing files are errors too, as clingo would report them.
+    """
+    if pyclingo is None:
+        raise Exception("clingo's python module is not installed.")
+
+    messages: List[str] = []
+    try:
+        pyclingo.ast.parse_files(
+            [str(path)],
+            lambda _statement: None,
+            logger=lambda _code, message: messages.append(message),
+        )
+    except RuntimeError:
+        return [line for msg in messages for line in msg.splitlines()]
+    return []
+
+
+class Models:
+    """Keeps the shown atoms of the last models, with the bounds of `clingo.run`."""
+
+    def __init__(self):
+        self.solutions: Deque[List[str]] = deque(maxlen=clingo.MAX_MODELS)
+        self.found = 0
+        # If the models have a cost, they may not be optimal yet
+        self.optimizing = False
+        # Seconds spent reading the models
+        self.parse_time = 0.0
+
+    def __call__(self, model):
+        t0 = time.time()
+        self.found += 1
+        self.optimizing = self.optimizing or len(model.cost) > 0
+        self.solutions.append(
+            intern_atoms(
+                str(symbol)
+                for symbol in model.symbols(shown=True)
+                if not symbol.match(TEST_GUARD, 1)
+            )
+        )
+        self.parse_time += time.time() - t0
+
+
+def _result(
+    exec_args,
+    t0: float,
+    status: Status,
+    models: Models,
+    messages,
+    timeout=False,
+    phases: Dict[str, float] = dict(),
+    statistics: Dict[str, int] = dict(),
+):
+    return {
+        "args": [str(s) for s in exec_args],
+        "time": time.time() - t0,
+        "timeout": timeout,
+        "status": status,
+        "solutions": list(models.solutions),
+        "truncated": models.found > len(models.solutions),
+        "stdout": [],
+        "stderr": [line for msg in messages for line in msg.splitlines()],
+        "phases": dict(phases, parse=models.parse_time),
+        "statistics": statistics,
+    }
+
+
+def _statistics(control) -> Dict[str, int]:
+    """The `clingo.run` statistics of the last solve, there's no `max_rss` in-process."""
+    stats = control.statistics
+    return {
+        "atoms": int(stats["problem"]["lp"]["atoms"]),
+        "rules": int(stats["problem"]["lp"]["rules"]),
+        "choices": int(stats["solving"]["solvers"]["choices"]),
+        "conflicts": int(stats["solving"]["solvers"]["conflicts"]),
+        "restarts": int(stats["solving"]["solvers"]["restarts"]),
+    }
+
+
+def _solve(
+    control, timeout: float, on_model: Models, models: int
+) -> Tuple[Status, bool]:
+    """Solves for up to `timeout` seconds, interrupted runs keep their models.
+
+    Returns the status and if the run was interrupted. As with `clingo.run`,
+    interrupted runs are `TIMEOUT` unless all the `models` were found.
+    """
+    with control.solve(on_model=on_model, async_=True) as handle:
+        if not handle.wait(max(0, timeout)):
+            handle.cancel()
+            if 0 < models <= on_model.found and not on_model.optimizing:
+                return Status.SATISFIABLE, True
+            return Status.TIMEOUT, True
+        solve_result = handle.get()
+
+    if solve_result.satisfiable:
+        return Status.SATISFIABLE, False
+    if solve_result.unsatisfiable:
+        return Status.UNSATISFIABLE, False
+    return Status.UNKNOWN, False
+
+
+def run(
+    args: List[str],
+    base_files: List[str] = [],
+    timeout: float = DEFAULT_TIMEOUT,
+    models: int = 1,
+    constants: Optional[Dict] = None,
+    memory_limit: Optional[int] = None,
+    cpu_limit: Optional[float] = None,
+    project: bool = False,
+):
+    """Same as `clingo.run`, but solving in-process with clingo's python API.
+
+    Models have the same atoms, but in clingo's symbol order instead of the
+    order the executable prints them. There's no `stdout` to keep, the
+    messages clingo would print on `stderr` are kept instead. The timeout only
+    bounds solving, grounding can't be interrupted. There's no resource limits
+    (`memory_limit`, `cpu_limit`) in-process, they're ignored.
+    """
+    if pyclingo is None:
+        raise Exception("clingo's python module is not installed.")
+
+    t0 = time.time()
+    flags = clingo.solver_flags(models, constants, project)
+    exec_args = clingo.command(args, base_files, models, constants, project=project)
+
+    messages: List[str] = []
+    on_model = Models()
+    phases: Dict[str, float] = dict()
+
+    try:
+        control = pyclingo.Control(
+            flags, logger=lambda _code, message: messages.append(message)
+        )
+        for path in base_files + args:
+            control.load(str(path))
+        control.ground([("base", [])])
+    except RuntimeError:
+        # Parsing/grounding errors were already reported to `logger`.
+        return _result(exec_args, t0, Status.SYNTAX_ERROR, on_model, messages)
+    except Exception:
+        return _result(exec_args, t0, Status.UNKNOWN, on_model, messages, True)
+    phases["ground"] = time.time() - t0
+
+    status, interrupted = _solve(control, timeout - phases["ground"], on_model, models)
+    phases["solve"] = time.time() - t0 - phases["ground"]
+    return _result(
+        exec_args,
+        t0,
+        status,
+        on_model,
+        messages,
+        interrupted,
+        phases,
+        _statistics(control),
+    )
+
+
+# Marks the rules of each test on `run_grounded_once`.
+TEST_GUARD = "__judge_test"
+
+
+def _guard_test(statement, guard):
+    """Makes the rules of a test file conditional on the `guard` literal."""
+    ast = pyclingo.ast
+    if statement.ast_type in [ast.ASTType.Rule, ast.ASTType.Minimize]:
+        return statement.update(body=list(statement.body) + [guard])
+    if statement.ast_type == ast.ASTType.Program and statement.name == "base":
+        return statement
+    if statement.ast_type in [ast.ASTType.ShowSignature, ast.ASTType.Defined]:
+        return statement
+    raise ValueError("Can't guard statement '{}'".format(statement))
+
+
+def run_grounded_once(
+    args: List[str],
+    tests: List[Tuple[str, int, float]],
+    base_files: List[str] = [],
+    constants: Optional[Dict] = None,
+    project: bool = False,
+):
+    """Runs several `(test_file, models, timeout)` tests that share everything else.
+
+    The shared program (`base_files` and `args`) is grounded only once,
+    together with the rules of every test, each one guarded by an external
+    atom. Then each test is solved with only its own external set to true.
+    Grounding the rules of the other tests doesn't change the answer sets, but
+    the first models found might not be the same ones of single runs.
+
+    Returns the same results as `run`, for each test. Grounding time is split
+    evenly between the tests. If the tests can't be grounded together, they're
+    just run one by one.
+    """
+    if pyclingo is None:
+        raise Exception("clingo's python module is not installed.")
+
+    t0 = time.time()
+    flags = clingo.solver_flags(0, constants, project)
+    messages: List[str] = []
+
+    def single_runs():
+        return [
+            run(args + [test], base_files, timeout, models, constants, project=project)
+            for (test, models, timeout) in tests
+        ]
+
+    try:
+        control = pyclingo.Control(
+            flags, logger=lambda _code, message: messages.append(message)
+        )
+        for path in base_files + args:
+            control.load(str(path))
+
+        with pyclingo.ast.ProgramBuilder(control) as builder:
+            for i, (test, _models, _timeout) in enumerate(tests):
+                guard: List[Any] = []
+                pyclingo.ast.parse_string(
+                    "guard :- {}({}).".format(TEST_GUARD, i),
+                    lambda rule: guard.extend(getattr(rule, "body", [])),
+                )
+                pyclingo.ast.parse_files(
+                    [str(test)],
+                    lambda statement: builder.add(_guard_test(statement, guard[0])),
+                )
+        control.add(
+            "base", [], "#external {}(0..{}).".format(TEST_GUARD, len(tests) - 1)
+        )
+        control.ground([("base", [])])
+    except (RuntimeError, ValueError):
+        # Report errors exactly as single runs.
+        return single_runs()
+
+    ground_time = (time.time() - t0) / len(tests)
+    results = []
+    for i, (test, models, timeout) in enumerate(tests):
+        t1 = time.time() - ground_time
+        exec_args = clingo.command(
+            args + [test], base_files, models, constants, project=project
+        )
+        on_model = Models()
+
+        guards = [
+            pyclingo.Function(TEST_GUARD, [pyclingo.Number(j)])
+            for j in range(len(tests))
+        ]
+        for j, guard in enumerate(guards):
+            control.assign_external(guard, i == j)
+        control.configuration.solve.models = str(models)
+
+        solve_t0 = time.time()
+        status, interrupted = _solve(
+            control, timeout - (solve_t0 - t1), on_model, models
+        )
+        phases = {"ground": ground_time, "solve": time.time() - solve_t0}
+        results.append(
+            _result(
+                exec_args,
+                t1,
+                status,
+                on_model,
+                messages,
+                interrupted,
+                phases,
+                _statistics(control),
+            )
+        )
+    return results
@@ -1,131 +1,325 @@
 #!/usr/bin/env python
 
 import os
-import re
 
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional, Set, Tuple
 
 import judge
 
+from log import LogLevel
 from strips import StripsValidator
-
-
-INSTANCES_PATH = judge.INSTANCES_PATH
-OUTPUT_PATH = judge.OUTPUT_PATH
-
-
-# Parse expressions
-DOOR = re.compile(r"^door\((?P<name>.*)\)$")
-ROOM = re.compile(r"^room\((?P<name>.*)\)$")
-OFFICE = re.compile(r"^office\((?P<name>.*)\)$")
-KITCHEN = re.compile(r"^kitchen\((?P<name>.*)\)$")
-DRINK = re.compile(r"^drink\((?P<name>.*)\)$")
-CONNECTED = re.compile(r"^connected\((?P<src>.*),(?P<dst>.*),(?P<door>.*)\)$")
+from validator import handles, parse_term
 
 
 class Drink:
+    __slots__ = ["name"]
+
     def __init__(self, name):
         self.name = name
 
 
 class Room:
+    __slots__ = ["name", "drinks", "neighbors"]
+
     def __init__(self, name):
         self.name = name
         self.drinks: Set[Drink] = set()
-        self.neighbors: Set[Room] = set()
+        # Names of the rooms connected to this one
+        self.neighbors: Set[str] = set()
 
 
 class Office(Room):
+    __slots__ = []
+
     def __init__(self, name):
         super().__init__(name)
 
 
 class Kitchen(Room):
+    __slots__ = []
+
     def __init__(self, name):
         super().__init__(name)
 
 
 class Door:
+    __slots__ = ["name", "is_open", "rooms"]
+
     def __init__(self, name, room1, room2):
         self.name = name
         self.is_open = False
-        self.rooms: Tuple[Door, Door] = (room1, room2)
+        self.rooms: Tuple[Room, Room] = (room1, room2)
 
     def open(self):
-        pass
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
 
 
 class Agent:
+    __slots__ = ["name", "drinks"]
+
     def __init__(self, name):
         self.name = name
         self.drinks: Set[Drink] = set()
 
 
-class CoffeeValidator(StripsValidator):
-    def __init__(self, solution):
-        super().__init__(solution)
+class CoffeeState:
+    """Agent locations, doors and deliveries at a time, from its `holds`."""
+
+    __slots__ = ["locations", "open_doors", "closed_doors", "delivered"]
 
+    def __init__(self, fluents: Set[str]):
+        # Rooms of each agent, there should be only one
+        self.locations: Dict[str, Set[str]] = dict()
+        self.open_doors: Set[str] = set()
+        self.closed_doors: Set[str] = set()
+        self.delivered: Set[Tuple[str, str]] = set()
+
+        for f in fluents:
+            (name, args) = parse_term(f)
+            if name == "agentAt" and len(args) == 1:
+                self.locations.setdefault("defaultAgent", set()).add(args[0])
+            elif name == "agentAt" and len(args) == 2:
+                self.locations.setdefault(args[0], set()).add(args[1])
+            elif name == "isOpen" and len(args) == 1:
+                self.open_doors.add(args[0])
+            elif name == "isClosed" and len(args) == 1:
+                self.closed_doors.add(args[0])
+            elif name == "delivered" and len(args) == 2:
+                self.delivered.add((args[0], args[1]))
+
+    def location(self, agent: str) -> Optional[str]:
+        rooms = self.locations.get(agent, set())
+        if len(rooms) != 1:
+            return None
+        return next(iter(rooms))
+
+
+class CoffeeValidator(StripsValidator):
+    __slots__ = [
+        "door_names",
+        "rooms",
+        "drinks",
+        "connections",
+        "doors",
+        "doors_between",
+    ]
+
+    # The goal is checked on `holds`, with `delivered` derived from `has`.
+    SIMULATE_GOAL = False
+    STATIC_ATTRIBUTES = StripsValidator.STATIC_ATTRIBUTES + [
+        "door_names",
+        "rooms",
+        "drinks",
+        "connections",
+    ]
+
+    def __init__(self, solution, context=None):
         self.door_names: Set[str] = set()
         self.rooms: Dict[str, Room] = dict()
         self.drinks: Dict[str, Drink] = dict()
-
-        for pred in self.solution:
-            skipped = False
-            if (m := DOOR.search(pred)) is not None:
-                self.door_names.add(m.group("name"))
-            elif (m := ROOM.search(pred)) is not None:
-                name = m.group("name")
-                self.rooms[name] = Room(name)
-            elif (m := OFFICE.search(pred)) is not None:
-                name = m.group("name")
-                self.rooms[name] = Office(name)
-            elif (m := KITCHEN.search(pred)) is not None:
-                name = m.group("name")
-                self.rooms[name] = Kitchen(name)
-            elif (m := DRINK.search(pred)) is not None:
-                name = m.group("name")
-                self.drinks[name] = Drink(name)
-            elif (m := CONNECTED.search(pred)) is not None:
-                pass
-            else:
-                skipped = True
-            if not skipped:
-                if pred not in self.parsed_predicates:
-                    self.parsed_predicates.add(pred)
+        self.connections: List[Tuple[str, str, str]] = []
+
+        super().__init__(solution, context)
+
+        # Room graph, rooms only named by `connected/3` are plain rooms.
+        self.doors: Dict[str, Door] = dict()
+        # Doors between each pair of rooms, both ways
+        self.doors_between: Dict[str, Dict[str, Set[str]]] = dict()
+        for (src, dst, door) in self.connections:
+            room1 = self.rooms.setdefault(src, Room(src))
+            room2 = self.rooms.setdefault(dst, Room(dst))
+            room1.neighbors.add(dst)
+            room2.neighbors.add(src)
+            self.doors[door] = Door(door, room1, room2)
+            self.doors_between.setdefault(src, dict()).setdefault(dst, set()).add(door)
+            self.doors_between.setdefault(dst, dict()).setdefault(src, set()).add(door)
+
+    @handles("door", 1, static=True)
+    def parse_door(self, name):
+        self.door_names.add(name)
+
+    @handles("room", 1, static=True)
+    def parse_room(self, name):
+        self.rooms[name] = Room(name)
+
+    @handles("office", 1, static=True)
+    def parse_office(self, name):
+        self.rooms[name] = Office(name)
+
+    @handles("kitchen", 1, static=True)
+    def parse_kitchen(self, name):
+        self.rooms[name] = Kitchen(name)
+
+    @handles("drink", 1, static=True)
+    def parse_drink(self, name):
+        self.drinks[name] = Drink(name)
+
+    @handles("connected", 3, static=True)
+    def parse_connected(self, src, dst, door):
+        self.connections.append((src, dst, door))
 
     def verify(self):
         logs = super().verify()
 
+        for t, instant_plan in enumerate(self.plan):
+            for agent, actions in instant_plan.items():
+                if len(actions) > 1:
+                    logs.append(
+                        (
+                            LogLevel.WARNING,
+                            "'{}' is executing multiple actions at t={}: {}".format(
+                                agent.name, t, sorted(actions, key=lambda a: a.raw)
+                            ),
+                        )
+                    )
+
+        if self.holds.is_empty():
+            logs.append(
+                (LogLevel.WARNING, "There's no `holds`, the plan can't be simulated.")
+            )
+            return logs
+
+        states = [CoffeeState(fluents) for fluents in self.holds]
+        # Agents that went through a kitchen, where drinks are prepared
+        visited_kitchen: Set[str] = set()
+        for t, state in enumerate(states):
+            self.check_state(t, state, logs)
+            for agent_name in state.locations:
+                if isinstance(self.rooms.get(state.location(agent_name)), Kitchen):
+                    visited_kitchen.add(agent_name)
+            if t + 1 < len(states):
+                self.check_step(t, state, states[t + 1], visited_kitchen, logs)
+
+        final = set(self.holds[-1])
+        for f in self.goal:
+            if f not in final:
+                logs.append(
+                    (
+                        LogLevel.ERROR,
+                        "The goal {} isn't reached at t={}.".format(f, len(states) - 1),
+                    )
+                )
+
         return logs
 
+    def check_state(self, t: int, state: CoffeeState, logs):
+        for agent_name, rooms in sorted(state.locations.items()):
+            if len(rooms) > 1:
+                logs.append(
+                    (
+                        LogLevel.ERROR,
+                        "'{}' is in several rooms at t={}: {}".format(
+                            agent_name, t, sorted(rooms)
+                        ),
+                    )
+                )
+        for door in sorted(state.open_doors & state.closed_doors):
+            logs.append(
+                (
+                    LogLevel.ERROR,
+                    "Door '{}' is both open and closed at t={}.".format(door, t),
+                )
+            )
+
+    def check_step(
+        self,
+        t: int,
+        state: CoffeeState,
+        next_state: CoffeeState,
+        visited_kitchen: Set[str],
+        logs,
+    ):
+        """Checks the changes between `t` and `t + 1`."""
+        # Doors explicitly closed, doors with an unknown state are let through.
+        for door in self.doors.values():
+            if door.name in state.closed_doors and door.name not in state.open_doors:
+                door.close()
+            else:
+                door.open()
+
+        crossings: Dict[Tuple[str, str], str] = dict()
+        for agent_name in sorted(state.locations):
+            src = state.location(agent_name)
+            dst = next_state.location(agent_name)
+            if src is None or dst is None or src == dst:
+                continue
+
+            doors = self.doors_between.get(src, dict()).get(dst, set())
+            if not doors:
+                logs.append(
+                    (
+                        LogLevel.ERROR,
+                        "'{}' moves from {} to {} at t={}, but they aren't connected.".format(
+                            agent_name, src, dst, t
+                        ),
+                    )
+                )
+                continue
+            if not any(self.doors[door].is_open for door in doors):
+                logs.append(
+                    (
+                        LogLevel.ERROR,
+                        "'{}' moves from {} to {} at t={}, but [{}] is closed.".format(
+                            agent_name, src, dst, t, ", ".join(sorted(doors))
+                        ),
+                    )
+                )
+
+            if (other := crossings.get((dst, src))) is not None:
+                logs.append(
+                    (
+                        LogLevel.WARNING,
+                        "'{}' and '{}' swap {} and {} at t={}.".format(
+                            other, agent_name, src, dst, t
+                        ),
+                    )
+                )
+            crossings[(src, dst)] = agent_name
+
+        for (room, drink) in sorted(next_state.delivered - state.delivered):
+            if drink not in self.drinks:
+                logs.append(
+                    (
+                        LogLevel.ERROR,
+                        "{} is delivered to {} at t={}, but there's no such drink.".format(
+                            drink, room, t + 1
+                        ),
+                    )
+                )
+            deliverers = [
+                agent_name
+                for agent_name in visited_kitchen
+                if room in [state.location(agent_name), next_state.location(agent_name)]
+            ]
+            if not deliverers:
+                logs.append(
+                    (
+                        LogLevel.ERROR,
+                        "{} is delivered to {} at t={}, but no agent coming from a kitchen is there.".format(
+                            drink, room, t + 1
+                        ),
+                    )
+                )
+
+        for (room, drink) in sorted(state.delivered - next_state.delivered):
+            logs.append(
+                (
+                    LogLevel.WARNING,
+                    "{} delivered to {} is gone at t={}.".format(drink, room, t + 1),
+                )
+            )
+
 
 class CoffeeInstance(judge.Instance):
-    def verify(self, solution):
-        v = CoffeeValidator(solution)
-        return {
-            "instance_summary": v.instance_summary(sep="\n" + " "*26),
-            "valid": len(solution) > 0 and v.is_valid(),
-            "logs": "\n                 > ".join(v.coloured_logs()),
-        }
+    validator_class = CoffeeValidator
 
 
 def main():
-    OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
-    print("Output path: ", OUTPUT_PATH)
-
-    for instance_dir in sorted(
-        [INSTANCES_PATH / p.name for p in INSTANCES_PATH.glob("*/")]
-    ):
-        instance = CoffeeInstance(
-            instance_dir=instance_dir,
-            assignment_path=judge.ASSIGNMENT_PATH,
-            output_path=OUTPUT_PATH,
-            is_single_agent=judge.SINGLE_AGENT,
-        )
-
-        instance.test()
-        print(instance.results_str())
+    judge.main(CoffeeInstance)
 
 
 if __name__ == "__main__":
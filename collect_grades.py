@@ -1,15 +1,20 @@
 #!/usr/bin/env python
 
+import argparse
+import bisect
 import contextlib
 import copy
 import json
+import math
 import os
 import re
-import statistics
-from collections import ChainMap
+from collections import ChainMap, Counter
 from decimal import Decimal
 from pathlib import Path
 
+import store
+from grade import TASKS, load_manifest
+
 
 @contextlib.contextmanager
 def pushd(new_dir):
@@ -110,7 +115,7 @@ SCORES = {
 }
 
 
-def grade(github_user):
+def load_tests():
     passed_tests = sorted([p.name for p in Path("test_results/passed").rglob("*.json")])
     failed_tests = sorted([p.name for p in Path("test_results/failed").rglob("*.json")])
     all_tests = [p for p in Path("test_results/passed").rglob("*.json")] + [
@@ -120,6 +125,28 @@ def grade(github_user):
     for test_path in all_tests:
         with open(test_path, "r") as json_file:
             test_data[test_path.name] = json.load(json_file)
+    return passed_tests, failed_tests, test_data
+
+
+def load_stored_tests(result_store, submission):
+    """Same as `load_tests`, with only the columns reports need."""
+    test_data = {
+        name + ".json": instance_data
+        for name, instance_data in result_store.instances(submission).items()
+    }
+    passed_tests = sorted([t for t, data in test_data.items() if data["passed"]])
+    failed_tests = sorted([t for t, data in test_data.items() if not data["passed"]])
+    return passed_tests, failed_tests, test_data
+
+
+def grade(github_user, result_store=None):
+    if result_store is None:
+        passed_tests, failed_tests, test_data = load_tests()
+    else:
+        submission = REPO_PREFIX + github_user
+        passed_tests, failed_tests, test_data = load_stored_tests(
+            result_store, submission
+        )
 
     # "dh-0.json": {
     #    "instance": "tests/csat/dep_hell/instances/0/instance.lp",
@@ -150,6 +177,7 @@ def grade(github_user):
             instance_name: {
                 "instance": instance_data["instance"],
                 "instance_time": instance_data["instance_time"],
+                "write_time": instance_data.get("write_time"),
                 "tested": instance_data["tested"],
                 "passed": instance_data["passed"],
                 "pos_tests": {
@@ -160,6 +188,8 @@ def grade(github_user):
                         "timeout": test_data["timeout"],
                         "verified": test_data["verified"],
                         # "verifications": test_data["verifications"],
+                        "phases": test_data.get("phases", dict()),
+                        "statistics": test_data.get("statistics", dict()),
                     }
                     for name, test_data in instance_data["positive_tests"].items()
                 },
@@ -171,6 +201,8 @@ def grade(github_user):
                         "timeout": test_data["timeout"],
                         "verified": test_data["verified"],
                         # "verifications": test_data["verifications"],
+                        "phases": test_data.get("phases", dict()),
+                        "statistics": test_data.get("statistics", dict()),
                     }
                     for name, test_data in instance_data["negative_tests"].items()
                 },
@@ -186,58 +218,267 @@ def grade(github_user):
 
 REPO_PREFIX = "tarea-2-2021-2-"
 
+DISTRIBUTION_PERCENTILES = [50, 90, 99]
 
-def summarize(reports):
-    scores = {test_name: [] for test_name in SCORES.keys()}
-    for name, report in reports.items():
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of already sorted values."""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def distribution(values):
+    values = sorted(values)
+    summary = {"count": len(values), "total": sum(values)}
+    for p in DISTRIBUTION_PERCENTILES:
+        summary["p{}".format(p)] = percentile(values, p)
+    summary["max"] = values[-1]
+    return summary
+
+
+# Scores are summarized as integer thousandths of a point
+SCALE = 1000
+QUANTILES = {"quartiles": 4, "quintiles": 5, "deciles": 10, "percentiles": 100}
+
+
+def quantiles(sorted_values, n, scale=1):
+    """Same as `statistics.quantiles(values, n=n)`, on already sorted values."""
+    ld = len(sorted_values)
+    if ld == 1:
+        return [sorted_values[0] / scale] * (n - 1)
+    # The default "exclusive" method
+    m = ld + 1
+    result = []
+    for i in range(1, n):
+        j = min(max(i * m // n, 1), ld - 1)
+        delta = i * m - j * n
+        result.append(
+            (sorted_values[j - 1] * (n - delta) + sorted_values[j] * delta)
+            / (n * scale)
+        )
+    return result
+
+
+def score_matrix(reports, test_names):
+    """Submissions × tests fixed-point scores, `None` where a test wasn't run."""
+    fixed_scores = [int(SCORES[test_name] * SCALE) for test_name in test_names]
+    column = {test_name: j for j, test_name in enumerate(test_names)}
+    matrix = []
+    for report in reports.values():
+        row = [None] * len(test_names)
         for name in report["passed_tests"]:
-            scores[name].append(SCORES[name])
+            row[column[name]] = fixed_scores[column[name]]
         for name in report["failed_tests"]:
-            scores[name].append(0.0)
-    for test_name, ss in scores.items():
-        if len(ss) == 0:
+            row[column[name]] = 0
+        matrix.append(row)
+    return matrix
+
+
+def summarize_scores(column):
+    """Statistics of a column of fixed-point scores, all from one sort."""
+    values = [value for value in column if value is not None]
+    ordered = sorted(values)
+    n = len(ordered)
+    middle = n // 2
+    median = ordered[middle]
+    if n % 2 == 0:
+        median = (ordered[middle - 1] + ordered[middle]) / 2
+    zeroes = bisect.bisect_right(ordered, 0)
+    summary = {
+        "scores": [value / SCALE for value in ordered],
+        "zeroes": zeroes,
+        "non_zeroes": n - zeroes,
+        "min": ordered[0] / SCALE,
+        "max": ordered[-1] / SCALE,
+        "mean": sum(ordered) / (n * SCALE),
+        "median": median / SCALE,
+        # The first one of the most common, in submission order
+        "mode": Counter(values).most_common(1)[0][0] / SCALE,
+    }
+    for name, parts in QUANTILES.items():
+        summary[name] = quantiles(ordered, parts, SCALE)
+    return summary
+
+
+def summarize_column(values):
+    """Distribution of `(value, github_user)`, with the submission of the highest one."""
+    return dict(
+        distribution([value for value, _ in values]), max_submission=max(values)[1]
+    )
+
+
+def summarize(reports):
+    test_names = list(SCORES.keys())
+    matrix = score_matrix(reports, test_names)
+    columns = list(zip(*matrix)) or [[] for _ in test_names]
+    for test_name, column in zip(test_names, columns):
+        if all(value is None for value in column):
             print("Empty test: ", test_name)
             raise Exception("aoeuaoeu")
-    f_scores = {
-        test_name: [float(s) for s in dec_scores]
-        for test_name, dec_scores in scores.items()
-    }
+
+    # Run times and solver statistics of every run of each test, with their
+    # submission
+    times = {test_name: [] for test_name in test_names}
+    solver_statistics = {test_name: dict() for test_name in test_names}
+    for github_user, report in reports.items():
+        for instance_name, instance_data in report["test_data"].items():
+            for tests in ["pos_tests", "neg_tests"]:
+                for test_data in instance_data[tests].values():
+                    times.setdefault(instance_name, []).append(
+                        (test_data["time"], github_user)
+                    )
+                    for key, value in test_data["statistics"].items():
+                        solver_statistics.setdefault(instance_name, dict()).setdefault(
+                            key, []
+                        ).append((value, github_user))
 
     summary = {
-        test_name: {
-            "scores": sorted(f_scores[test_name]),
-            "zeroes": sum([1 for s in test_scores if s == 0]),
-            "non_zeroes": sum([1 for s in test_scores if s > 0]),
-            "min": float(min(test_scores)),
-            "max": float(max(test_scores)),
-            "mean": float(statistics.mean(f_scores[test_name])),
-            "median": float(statistics.median(test_scores)),
-            "mode": float(statistics.mode(test_scores)),
-            "quartiles": statistics.quantiles(f_scores[test_name], n=4),
-            "quintiles": statistics.quantiles(f_scores[test_name], n=5),
-            "deciles": statistics.quantiles(f_scores[test_name], n=10),
-            "percentiles": statistics.quantiles(f_scores[test_name], n=100),
-        }
-        for test_name, test_scores in scores.items()
+        test_name: dict(
+            summarize_scores(column),
+            time=summarize_column(times[test_name]) if times[test_name] else None,
+            statistics={
+                key: summarize_column(values)
+                for key, values in solver_statistics[test_name].items()
+            },
+        )
+        for test_name, column in zip(test_names, columns)
     }
 
     return summary
 
 
+def totals(reports):
+    """Scores by submission and task, and their statistics over submissions."""
+    test_names = list(SCORES.keys())
+    matrix = score_matrix(reports, test_names)
+    tasks = sorted(set(task_name(test_name) for test_name in test_names))
+    task_columns = [
+        [j for j, test_name in enumerate(test_names) if task_name(test_name) == task]
+        for task in tasks
+    ]
+    task_scores = [
+        [sum(row[j] or 0 for j in columns) for columns in task_columns]
+        for row in matrix
+    ]
+    return {
+        "submissions": {
+            github_user: {
+                "total": sum(scores) / SCALE,
+                "tasks": {task: score / SCALE for task, score in zip(tasks, scores)},
+            }
+            for github_user, scores in zip(reports.keys(), task_scores)
+        },
+        "tasks": {
+            task: summarize_scores(column)
+            for task, column in zip(tasks, zip(*task_scores))
+        },
+    }
+
+
+# The `output_name` of each task, with the ones `grade.py` recorded on the
+# manifests of the assignments (e.g. with its `--tasks`)
+TASK_NAMES = set(task.output_name for task in TASKS)
+
+
+def task_name(instance_name):
+    """e.g. `blocks-simple-seq-0.json` is from `blocks-simple`."""
+    # Longest first, a task name could be the prefix of another one
+    for task in sorted(TASK_NAMES, key=len, reverse=True):
+        if instance_name.startswith(task + "-"):
+            return task
+    return instance_name[: -len(".json")]
+
+
+def profile(reports):
+    """Seconds spent on each grading phase, by task and by submission.
+
+    Phases of each test are `spawn`, `ground`, `solve`, `parse`, `validate`
+    (or `cache`, for cached runs), and `write` is per instance.
+    """
+    by_task = dict()
+    by_submission = dict()
+    for github_user, report in reports.items():
+        for instance_name, instance_data in report["test_data"].items():
+            task = task_name(instance_name)
+            timings = [
+                test_data["phases"]
+                for tests in ["pos_tests", "neg_tests"]
+                for test_data in instance_data[tests].values()
+            ]
+            if instance_data["write_time"] is not None:
+                timings.append({"write": instance_data["write_time"]})
+
+            for phases in timings:
+                for phase, seconds in phases.items():
+                    by_task.setdefault(task, dict()).setdefault(phase, []).append(
+                        seconds
+                    )
+                    by_submission.setdefault(github_user, dict()).setdefault(
+                        phase, []
+                    ).append(seconds)
+
+    return {
+        "tasks": {
+            task: {phase: distribution(s) for phase, s in phases.items()}
+            for task, phases in by_task.items()
+        },
+        "submissions": {
+            github_user: {phase: distribution(s) for phase, s in phases.items()}
+            for github_user, phases in by_submission.items()
+        },
+    }
+
+
+parser = argparse.ArgumentParser(description="Compute grades.")
+parser.add_argument("assignment_dirs", nargs="*")
+parser.add_argument(
+    "--results_db",
+    help="Read the results from this store, instead of the JSON files of each assignment.",
+)
+parser.add_argument(
+    "--update",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Patch full_report.json, only grading assignments with results newer than their report.",
+)
+
+
+def is_up_to_date():
+    """Whether `report.json` is newer than the last results `grade.py` recorded."""
+    manifest_path = Path("test_results/manifest.json")
+    report_path = Path("report.json")
+    return (
+        manifest_path.exists()
+        and report_path.exists()
+        and report_path.stat().st_mtime >= manifest_path.stat().st_mtime
+    )
+
+
 def main(argv):
-    # program_name = argv[0]
-    args = argv[1:]
+    args = parser.parse_args(argv[1:])
+    result_store = None
+    if args.results_db is not None:
+        result_store = store.ResultStore(Path(args.results_db))
 
     reports = dict()
-    for assignment_path in args:
+    if args.update and os.path.isfile("full_report.json"):
+        with open("full_report.json") as json_file:
+            reports = json.load(json_file)
+
+    for assignment_path in args.assignment_dirs:
         assignment_dir = os.path.basename(assignment_path)
         if not assignment_dir.startswith(REPO_PREFIX):
             print("Skipping ", assignment_path)
             continue
 
         github_user = assignment_dir[len(REPO_PREFIX) :]
+        TASK_NAMES.update(load_manifest(Path(assignment_path)).keys())
         with pushd(assignment_path):
-            report = grade(github_user)
+            if args.update and github_user in reports and is_up_to_date():
+                print("Up to date: ", github_user)
+                continue
+            report = grade(github_user, result_store)
             reports[github_user] = report
             with open("report.json", "w") as json_file:
                 json.dump(report, json_file)
@@ -252,6 +493,14 @@ def main(argv):
         json.dump(summary, json_file)
         print("Wrote `summary.json`")
 
+    with open("phases.json", "w") as json_file:
+        json.dump(profile(reports), json_file)
+        print("Wrote `phases.json`")
+
+    with open("totals.json", "w") as json_file:
+        json.dump(totals(reports), json_file)
+        print("Wrote `totals.json`")
+
 
 if __name__ == "__main__":
     import sys
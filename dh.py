@@ -1,43 +1,54 @@
 #!/usr/bin/env python
 
 from enum import Enum
-from logging import LogLevel
+from log import LogLevel
 from pathlib import Path
 from termcolor import colored
-from typing import Dict, Tuple, Set
-from validator import Validator
+from typing import Dict, List, Tuple, Set
+from validator import Validator, handles
 
 import judge
 import os
 import pprint
-import re
-
-
-ASSIGNMENT_PATH = judge.ASSIGNMENT_PATH
-INSTANCES_PATH = judge.INSTANCES_PATH
-OUTPUT_PATH = judge.OUTPUT_PATH
-
-# Parse expressions
-PROGRAM_REGEX = re.compile(r"^program\((?P<p>.*)\)$")
-VERSION_REGEX = re.compile(r"^version\((?P<l>.*),(?P<v>\d)\)$")
-LOWER_BOUND_REGEX = re.compile(r"^requiresAtLeast\((?P<p>.*),(?P<l>.*),(?P<v>\d)\)$")
-UPPER_BOUND_REGEX = re.compile(r"^requiresAtMost\((?P<p>.*),(?P<l>.*),(?P<v>\d)\)$")
-INSTALLED_REGEX = re.compile(r"^installed\((?P<l>.*),(?P<v>\d)\)$")
-SHOULD_DELETE_REGEX = re.compile(r"^shouldDelete\((?P<l>.*),(?P<v>\d)\)$")
-SHOULD_INSTALL_REGEX = re.compile(r"^shouldInstall\((?P<l>.*),(?P<v>\d)\)$")
-WANTS_REGEX = re.compile(r"^wants\((?P<p>.*)\)$")
 
 
 def format_libs(libs):
-    return ", ".join(["{}.so.{}".format(lib, v) for lib, v in libs])
+    return ", ".join(["{}.so.{}".format(lib, v) for lib, v in sorted(libs)])
 
 
 class DependencyHellValidator(Validator):
     """A model of the Dependency Hell problem."""
 
-    def __init__(self, solution):
-        super().__init__(solution)
-
+    __slots__ = [
+        "programs",
+        "libraries",
+        "lib_versions",
+        "wanted_programs",
+        "installed_libraries",
+        "lower_bounds",
+        "upper_bounds",
+        "desired_programs",
+        "should_delete",
+        "should_install",
+        "dependencies",
+        "lowest_version",
+        "highest_version",
+    ]
+
+    STATIC_ATTRIBUTES = [
+        "programs",
+        "libraries",
+        "lib_versions",
+        "installed_libraries",
+        "lower_bounds",
+        "upper_bounds",
+        "desired_programs",
+        "dependencies",
+        "lowest_version",
+        "highest_version",
+    ]
+
+    def __init__(self, solution, context=None):
         # Existing programs
         self.programs: Set[str] = set()
         # Existing libraries and their versions
@@ -60,47 +71,67 @@ class DependencyHellValidator(Validator):
         self.should_delete: Set[Tuple[str, int]] = set()
         self.should_install: Set[Tuple[str, int]] = set()
 
-        # Parse solution
-        for pred in self.solution:
-            skipped = False
-            if (m := PROGRAM_REGEX.search(pred)) is not None:
-                program = m.group("p")
-                self.programs.add(program)
-            elif (m := VERSION_REGEX.search(pred)) is not None:
-                library = m.group("l")
-                version = int(m.group("v"))
-                self.libraries.add(library)
-                self.lib_versions.add((library, version))
-            elif (m := LOWER_BOUND_REGEX.search(pred)) is not None:
-                program = m.group("p")
-                library = m.group("l")
-                version = int(m.group("v"))
-                self.lower_bounds.add((program, library, version))
-            elif (m := UPPER_BOUND_REGEX.search(pred)) is not None:
-                program = m.group("p")
-                library = m.group("l")
-                version = int(m.group("v"))
-                self.upper_bounds.add((program, library, version))
-            elif (m := INSTALLED_REGEX.search(pred)) is not None:
-                library = m.group("l")
-                version = int(m.group("v"))
-                self.installed_libraries.add((library, version))
-            elif (m := SHOULD_DELETE_REGEX.search(pred)) is not None:
-                library = m.group("l")
-                version = int(m.group("v"))
-                self.should_delete.add((library, version))
-            elif (m := SHOULD_INSTALL_REGEX.search(pred)) is not None:
-                library = m.group("l")
-                version = int(m.group("v"))
-                self.should_install.add((library, version))
-            elif (m := WANTS_REGEX.search(pred)) is not None:
-                program = m.group("p")
-                self.desired_programs.add(program)
-            else:
-                skipped = True
-            if not skipped:
-                if pred not in self.parsed_predicates:
-                    self.parsed_predicates.add(pred)
+        # Indexes of the constraints, built while parsing
+        # Libraries each program depends on
+        self.dependencies: Dict[str, Set[str]] = dict()
+        # Tightest bounds, by (program, library)
+        self.lowest_version: Dict[Tuple[str, str], int] = dict()
+        self.highest_version: Dict[Tuple[str, str], int] = dict()
+
+        super().__init__(solution, context)
+
+    @handles("program", 1, static=True)
+    def parse_program(self, program):
+        self.programs.add(program)
+
+    @handles("version", 2, static=True)
+    def parse_version(self, library, version):
+        if not version.isdigit():
+            return False
+        self.libraries.add(library)
+        self.lib_versions.add((library, int(version)))
+
+    @handles("requiresAtLeast", 3, static=True)
+    def parse_lower_bound(self, program, library, version):
+        if not version.isdigit():
+            return False
+        version = int(version)
+        self.lower_bounds.add((program, library, version))
+        self.dependencies.setdefault(program, set()).add(library)
+        bound = self.lowest_version.get((program, library), version)
+        self.lowest_version[(program, library)] = max(bound, version)
+
+    @handles("requiresAtMost", 3, static=True)
+    def parse_upper_bound(self, program, library, version):
+        if not version.isdigit():
+            return False
+        version = int(version)
+        self.upper_bounds.add((program, library, version))
+        self.dependencies.setdefault(program, set()).add(library)
+        bound = self.highest_version.get((program, library), version)
+        self.highest_version[(program, library)] = min(bound, version)
+
+    @handles("installed", 2, static=True)
+    def parse_installed(self, library, version):
+        if not version.isdigit():
+            return False
+        self.installed_libraries.add((library, int(version)))
+
+    @handles("shouldDelete", 2)
+    def parse_should_delete(self, library, version):
+        if not version.isdigit():
+            return False
+        self.should_delete.add((library, int(version)))
+
+    @handles("shouldInstall", 2)
+    def parse_should_install(self, library, version):
+        if not version.isdigit():
+            return False
+        self.should_install.add((library, int(version)))
+
+    @handles("wants", 1, static=True)
+    def parse_wants(self, program):
+        self.desired_programs.add(program)
 
     def __str__(self) -> str:
         if self.valid is None:
@@ -214,31 +245,23 @@ class DependencyHellValidator(Validator):
                     (
                         LogLevel.WARNING,
                         "Asked to install lib {}, but it's already installed. This is odd, but allowed.".format(
-                            del_lib
+                            add_lib
                         ),
                     )
                 )
                 continue
             installed.add(add_lib)
 
-        for program in self.desired_programs:
-            deps = set()
-
-            for (l_p, lib, _) in self.lower_bounds:
-                if program == l_p:
-                    deps.add(lib)
-            for (u_p, lib, _) in self.upper_bounds:
-                if program == u_p:
-                    deps.add(lib)
-
-            for required_lib in deps:
-                available_versions = sorted(
-                    [
-                        installed_version
-                        for (installed_library, installed_version) in installed
-                        if installed_library == required_lib
-                    ]
-                )
+        # Installed versions of each library, sorted
+        versions: Dict[str, List[int]] = dict()
+        for (installed_library, installed_version) in installed:
+            versions.setdefault(installed_library, []).append(installed_version)
+        for available_versions in versions.values():
+            available_versions.sort()
+
+        for program in sorted(self.desired_programs):
+            for required_lib in sorted(self.dependencies.get(program, set())):
+                available_versions = versions.get(required_lib, [])
 
                 if len(available_versions) == 0:
                     logs.append(
@@ -251,24 +274,16 @@ class DependencyHellValidator(Validator):
                     )
                     continue
 
-                low = min(available_versions)
-                high = max(available_versions)
-
-                # NOTE: This should be indexed to avoid skipping most entries
-                for (l_p, l_l, l_v) in self.lower_bounds:
-                    if l_p != program:
-                        continue
-                    if l_l != required_lib:
-                        continue
-                    if l_v > low:
-                        low = l_v
-                for (u_p, u_l, u_v) in self.upper_bounds:
-                    if u_p != program:
-                        continue
-                    if u_l != required_lib:
-                        continue
-                    if u_v < high:
-                        high = u_v
+                low = max(
+                    available_versions[0],
+                    self.lowest_version.get((program, required_lib), -1),
+                )
+                high = min(
+                    available_versions[-1],
+                    self.highest_version.get(
+                        (program, required_lib), available_versions[-1]
+                    ),
+                )
 
                 # `program` needs `required_lib` in a version \in [low, high]
                 feasible_versions = [
@@ -295,30 +310,14 @@ class DependencyHellValidator(Validator):
 
 
 class DependencyHellInstance(judge.Instance):
-    def verify(self, solution) -> Dict:
-        dh = DependencyHellValidator(solution)
-        return {
-            "instance_summary": dh.instance_summary(),
-            "valid": len(solution) > 0 and dh.is_valid(),
-            "logs": "\n                 > ".join(dh.coloured_logs()),
-        }
+    validator_class = DependencyHellValidator
 
+    def summary(self, v) -> str:
+        return v.instance_summary()
 
-def main():
-    OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
-    print("Output path: ", OUTPUT_PATH)
-
-    for instance_dir in sorted(
-        [INSTANCES_PATH / p.name for p in INSTANCES_PATH.glob("*/")]
-    ):
-        instance = DependencyHellInstance(
-            instance_dir=instance_dir,
-            assignment_path=ASSIGNMENT_PATH,
-            output_path=OUTPUT_PATH,
-        )
 
-        instance.test()
-        print(instance.results_str())
+def main():
+    judge.main(DependencyHellInstance)
 
 
 if __name__ == "__main__":
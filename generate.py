@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+
+import argparse
+import math
+import random
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# Generated instances, as the contents of each file by name (`instance.lp`,
+# `pos-0.lp`, `neg-0.lp`, ...)
+Files = Dict[str, str]
+
+
+def facts(name: str, values: List[str]) -> str:
+    """`name(a; b; ...)`, in the same layout as the hand-written instances."""
+    indent = " " * len(name)
+    return "{}( {}).\n".format(name, ("\n" + indent + "; ").join(values))
+
+
+def settings(**constants) -> str:
+    return "".join("%%% {}={}\n".format(k, v) for k, v in constants.items())
+
+
+def blocks(n_blocks: int, towers: int = 1, arms: int = 0, seed: int = 0) -> Files:
+    """Shuffles `n_blocks` stacked in `towers` into other `towers`.
+
+    With `arms`, the tests are for the multi-agent version. Each misplaced
+    block needs a move, so a plan takes at least that many steps (split
+    between the arms), the positive test has enough to take every block to
+    the table and stack them back.
+    """
+    rng = random.Random(seed)
+    names = ["b{}".format(i) for i in range(n_blocks)]
+
+    def stacks(order: List[str]) -> Dict[str, str]:
+        on = dict()
+        for t in range(towers):
+            tower = order[t::towers]
+            for (upper, lower) in zip(tower, tower[1:]):
+                on[upper] = lower
+            if tower:
+                on[tower[-1]] = "table"
+        return on
+
+    start = stacks(names)
+    goal = stacks(rng.sample(names, len(names)))
+    misplaced = sum(1 for b in names if start[b] != goal[b])
+
+    instance = (
+        "% {} blocks, from {} towers to {} others\n\n".format(n_blocks, towers, towers)
+        + facts("block", names)
+        + "\n"
+        + facts("start", ["on({}, {})".format(b, start[b]) for b in names])
+        + "\n"
+        + facts("goal", ["on({}, {})".format(b, goal[b]) for b in names])
+    )
+    header = ""
+    if arms > 0:
+        header = facts("arm", ["a{}".format(i) for i in range(arms)]) + "\n"
+
+    files = {
+        "instance.lp": instance,
+        "pos-0.lp": settings(k=2 * n_blocks, MODELS=1)
+        + "\n"
+        + header
+        + "% Enough time to unstack and stack every block\n",
+    }
+    lower_bound = math.ceil(misplaced / max(1, arms))
+    if lower_bound > 0:
+        files["neg-0.lp"] = (
+            settings(k=lower_bound - 1, MODELS=1)
+            + "\n"
+            + header
+            + "% Not enough time to move the {} misplaced blocks\n".format(misplaced)
+        )
+    return files
+
+
+def statues(length: int, red: float = 0.3, seed: int = 0) -> Files:
+    """A corridor of `length` cells, where time steps are red with probability `red`.
+
+    Moving takes a non-red time step, so the shortest plan is known exactly.
+    """
+    rng = random.Random(seed)
+    moves = length - 1
+    red_steps = []
+    t = 0
+    while moves > 0:
+        if rng.random() < red:
+            red_steps.append(t)
+        else:
+            moves -= 1
+        t += 1
+
+    instance = (
+        "% Statues corridor of {} cells, {} red steps\n\n".format(
+            length, len(red_steps)
+        )
+        + "x(0..{}).\n\n".format(length - 1)
+        + "start(at(0)).\n"
+        + "goal(at({})).\n\n".format(length - 1)
+        + "".join("isRed({}).\n".format(s) for s in red_steps)
+    )
+    files = {
+        "instance.lp": instance,
+        "pos-0.lp": settings(k=t, MODELS=1) + "\n% Just enough time\n",
+    }
+    if t > 0:
+        files["neg-0.lp"] = settings(k=t - 1, MODELS=1) + "\n% Not enough time\n"
+    return files
+
+
+def dependency_hell(
+    programs: int, libraries: int, versions: int, seed: int = 0
+) -> Files:
+    """Programs that need random ranges of versions of some libraries.
+
+    Every range has a version, so wanting all the programs is possible. The
+    negative test asks for a version range that doesn't exist.
+    """
+    rng = random.Random(seed)
+    program_names = ["p{}".format(i) for i in range(programs)]
+    library_names = ["l{}".format(i) for i in range(libraries)]
+
+    lines = []
+    for library in library_names:
+        lines += ["version({}, {}).".format(library, v) for v in range(versions)]
+        lines += [
+            "installed({}, {}).".format(library, v)
+            for v in range(versions)
+            if rng.random() < 0.2
+        ]
+    lines.append("")
+    for program in program_names:
+        for library in rng.sample(library_names, rng.randint(1, min(3, libraries))):
+            low = rng.randrange(versions)
+            high = rng.randrange(low, versions)
+            if low > 0 or rng.random() < 0.5:
+                lines.append(
+                    "requiresAtLeast({}, {}, {}).".format(program, library, low)
+                )
+            if high < versions - 1 or rng.random() < 0.5:
+                lines.append(
+                    "requiresAtMost({}, {}, {}).".format(program, library, high)
+                )
+
+    instance = (
+        "% {} programs, {} libraries with {} versions each\n\n".format(
+            programs, libraries, versions
+        )
+        + facts("program", program_names)
+        + "\n"
+        + "\n".join(lines)
+        + "\n"
+    )
+    files = {
+        "instance.lp": instance,
+        "pos-0.lp": settings(MODELS=1) + "\n" + facts("wants", program_names),
+    }
+    if versions > 1:
+        files["neg-0.lp"] = (
+            settings(MODELS=1)
+            + "\n% No version is both\n"
+            + "requiresAtLeast(p0, l0, {}).\n".format(versions - 1)
+            + "requiresAtMost(p0, l0, {}).\n".format(versions - 2)
+            + "\nwants(p0).\n"
+        )
+    return files
+
+
+def coffee(
+    hallways: int,
+    offices: int = 4,
+    drinks: int = 3,
+    deliveries: int = 1,
+    agents: int = 0,
+    seed: int = 0,
+) -> Files:
+    """An office with a line of `hallways`, each with its `offices`.
+
+    The kitchen is next to the first hallway, and every agent starts in it.
+    With `agents`, the tests are for the multi-agent version. The positive
+    test has the time to prepare and take every drink, open every door and
+    visit each office on a path, the negative one not even for the farthest
+    delivery.
+    """
+    rng = random.Random(seed)
+    hallway_names = ["hallway{}".format(h) for h in range(hallways)]
+    office_names = [
+        "office{}_{}".format(h, o) for h in range(hallways) for o in range(offices)
+    ]
+    drink_names = ["drink{}".format(d) for d in range(drinks)]
+
+    connections: List[Tuple[str, str, str]] = [("hallway0", "kitchen1", "doorKitchen")]
+    for h in range(1, hallways):
+        connections.append(
+            (
+                "hallway{}".format(h - 1),
+                "hallway{}".format(h),
+                "hallwayDoor{}".format(h),
+            )
+        )
+    for h in range(hallways):
+        for o in range(offices):
+            connections.append(
+                (
+                    "hallway{}".format(h),
+                    "office{}_{}".format(h, o),
+                    "door{}_{}".format(h, o),
+                )
+            )
+
+    neighbors: Dict[str, List[Tuple[str, str]]] = dict()
+    for (a, b, door) in connections:
+        neighbors.setdefault(a, []).append((b, door))
+        neighbors.setdefault(b, []).append((a, door))
+
+    def path(source: str, target: str) -> List[Tuple[str, str]]:
+        """Rooms and doors from `source` to `target`."""
+        previous: Dict[str, Optional[Tuple[str, str]]] = {source: None}
+        queue = deque([source])
+        while queue:
+            room = queue.popleft()
+            for (next_room, door) in neighbors.get(room, []):
+                if next_room not in previous:
+                    previous[next_room] = (room, door)
+                    queue.append(next_room)
+        steps = []
+        room = target
+        while (step := previous[room]) is not None:
+            (prior, door) = step
+            steps.append((room, door))
+            room = prior
+        return steps[::-1]
+
+    # Different deliveries, a goal can't have the same one twice
+    goal = rng.sample(
+        [(o, d) for o in office_names for d in drink_names],
+        min(deliveries, len(office_names) * len(drink_names)),
+    )
+
+    # Upper bound: prepare and take every drink, open all doors, then deliver
+    # along shortest paths
+    upper_bound = 2 * len(goal) + len(connections)
+    room = "kitchen1"
+    for (office, _) in goal:
+        upper_bound += len(path(room, office)) + 1
+        room = office
+    # Lower bound: a single agent prepares, walks to the farthest office and
+    # delivers
+    farthest = max(goal, key=lambda g: len(path("kitchen1", g[0])))[0]
+    lower_bound = len(path("kitchen1", farthest)) + 2
+    if agents == 0:
+        # and does everything else itself, including opening the doors
+        lower_bound = 2 * len(goal) + 2 * len(path("kitchen1", farthest))
+    # The positive test must have more time than the negative one
+    upper_bound = max(upper_bound, lower_bound + 1)
+
+    instance = (
+        "% {} hallways with {} offices each\n\n".format(hallways, offices)
+        + facts("room", hallway_names)
+        + "\n"
+        + facts("office", office_names)
+        + "\n"
+        + "kitchen(kitchen1).\n\n"
+        + "".join("connected({}, {}, {}).\n".format(*c) for c in connections)
+        + "\n"
+        + facts("drink", drink_names)
+    )
+
+    agent_names = ["robot{}".format(a) for a in range(agents)]
+    if agents == 0:
+        test = "start(agentAt(kitchen1)).\n\n"
+    else:
+        test = (
+            facts("agent", agent_names)
+            + "\n"
+            + facts("start", ["agentAt({}, kitchen1)".format(a) for a in agent_names])
+            + "\n"
+        )
+    test += facts("goal", ["delivered({}, {})".format(o, d) for (o, d) in goal])
+
+    return {
+        "instance.lp": instance,
+        "pos-0.lp": settings(k=upper_bound, MODELS=1) + "\n" + test,
+        "neg-0.lp": settings(k=lower_bound - 1, MODELS=1) + "\n" + test,
+    }
+
+
+GENERATORS = {
+    "blocks": blocks,
+    "statues": statues,
+    "dh": dependency_hell,
+    "coffee": coffee,
+}
+
+
+def write_instance(instance_dir: Path, files: Files):
+    instance_dir.mkdir(parents=True, exist_ok=True)
+    for (name, contents) in files.items():
+        (instance_dir / name).write_text(contents)
+
+
+parser = argparse.ArgumentParser(description="Generate instances of any size.")
+parser.add_argument("domain", choices=GENERATORS.keys())
+parser.add_argument(
+    "--output_dir",
+    required=True,
+    help="Directory of the instance, with its `instance.lp` and tests.",
+)
+parser.add_argument("--seed", type=int, default=0)
+# blocks
+parser.add_argument("--blocks", type=int, default=10)
+parser.add_argument("--towers", type=int, default=2)
+parser.add_argument("--arms", type=int, default=0, help="Multi-agent if given.")
+# statues
+parser.add_argument("--length", type=int, default=8)
+parser.add_argument("--red", type=float, default=0.3, help="Chance of each red step.")
+# dh
+parser.add_argument("--programs", type=int, default=4)
+parser.add_argument("--libraries", type=int, default=4)
+parser.add_argument("--versions", type=int, default=4)
+# coffee
+parser.add_argument("--hallways", type=int, default=2)
+parser.add_argument("--offices", type=int, default=4, help="Offices per hallway.")
+parser.add_argument("--drinks", type=int, default=3)
+parser.add_argument("--deliveries", type=int, default=1)
+parser.add_argument("--agents", type=int, default=0, help="Multi-agent if given.")
+
+
+def generate(domain: str, args) -> Files:
+    if domain == "blocks":
+        return blocks(args.blocks, args.towers, args.arms, args.seed)
+    if domain == "statues":
+        return statues(args.length, args.red, seed=args.seed)
+    if domain == "dh":
+        return dependency_hell(args.programs, args.libraries, args.versions, args.seed)
+    return coffee(
+        args.hallways,
+        args.offices,
+        args.drinks,
+        args.deliveries,
+        args.agents,
+        args.seed,
+    )
+
+
+def main():
+    args = parser.parse_args()
+    write_instance(Path(args.output_dir), generate(args.domain, args))
+
+
+if __name__ == "__main__":
+    main()
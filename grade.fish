@@ -27,6 +27,12 @@ function grade
   mkdir $argv/test_results/failed
   mkdir $argv/test_results/logs
 
+  # Only show the atoms each judge validates
+  mkdir $argv/test_results/show
+  for judge in dh statues blocks coffee
+    ./show.py $judge > $argv/test_results/show/$judge.lp
+  end
+
   echo "    - Running tests"
 
   echo "      - Constraint Satisfaction"
@@ -38,7 +44,8 @@ function grade
     --instances_dir ./tests/csat/dep_hell/instances \
     --output_name dh \
     --output_dir $argv/test_results/ \
-    --base_files $argv/csat/dep_hell/dh.lp
+    --base_files $argv/csat/dep_hell/dh.lp \
+                 $argv/test_results/show/dh.lp
 
   echo "      - Planning"
   set_color blue
@@ -50,7 +57,8 @@ function grade
     --output_name statues \
     --output_dir $argv/test_results/ \
     --base_files $argv/planning/strips.lp \
-                 $argv/planning/statues/statues.lp
+                 $argv/planning/statues/statues.lp \
+                 $argv/test_results/show/statues.lp
 
   set_color blue
   echo "        - Blocks-world single-agent"
@@ -62,7 +70,8 @@ function grade
     --output_dir $argv/test_results/ \
     --single_agent \
     --base_files $argv/planning/strips.lp \
-                 $argv/planning/blocks/blocks.lp
+                 $argv/planning/blocks/blocks.lp \
+                 $argv/test_results/show/blocks.lp
   set_color blue
   echo "        - Blocks-world multi-agent"
   set_color normal
@@ -72,7 +81,8 @@ function grade
     --output_name blocks-multi \
     --output_dir $argv/test_results/ \
     --base_files $argv/planning/strips-multiagent.lp \
-                 $argv/planning/blocks/blocks-multiagent.lp
+                 $argv/planning/blocks/blocks-multiagent.lp \
+                 $argv/test_results/show/blocks.lp
 
   set_color blue
   echo "        - Coffee single-agent"
@@ -85,7 +95,8 @@ function grade
     --single_agent \
     --base_files $argv/planning/strips.lp \
                  ./tests/planning/coffee/compat.lp \
-                 $argv/planning/coffee/coffee.lp
+                 $argv/planning/coffee/coffee.lp \
+                 $argv/test_results/show/coffee.lp
   set_color blue
   echo "        - Coffee multi-agent"
   set_color normal
@@ -96,7 +107,8 @@ function grade
     --output_dir $argv/test_results/ \
     --base_files $argv/planning/strips-multiagent.lp \
                  ./tests/planning/coffee/compat.lp \
-                 $argv/planning/coffee/coffee-multiagent.lp
+                 $argv/planning/coffee/coffee-multiagent.lp \
+                 $argv/test_results/show/coffee.lp
 end
 
 
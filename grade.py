@@ -0,0 +1,598 @@
+#!/usr/bin/env python
+
+import argparse
+import functools
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from termcolor import colored
+
+import cache
+import clingo_api
+import judge
+import show
+import store
+from blocks import BlocksWorldInstance
+from coffee import CoffeeInstance
+from dh import DependencyHellInstance
+from statues import StatuesInstance
+
+
+JUDGES = {
+    "dh": DependencyHellInstance,
+    "statues": StatuesInstance,
+    "blocks": BlocksWorldInstance,
+    "coffee": CoffeeInstance,
+}
+
+
+class Task(NamedTuple):
+    # One of `JUDGES`
+    judge: str
+    # tests/planning/blocks/multi/instances/
+    instances_dir: str
+    # `{assignment}` is replaced by the directory of the assignment.
+    base_files: List[str]
+    single_agent: bool
+    # blocks-multi
+    output_name: str
+    # Predicates the models of a test should differ on, with --project
+    project: List[str] = []
+
+
+# Same tasks as `grade.fish`.
+TASKS = [
+    Task(
+        judge="dh",
+        instances_dir="./tests/csat/dep_hell/instances",
+        base_files=["{assignment}/csat/dep_hell/dh.lp"],
+        single_agent=False,
+        output_name="dh",
+        project=["shouldInstall/2", "shouldDelete/2"],
+    ),
+    Task(
+        judge="statues",
+        instances_dir="./tests/planning/statues/instances",
+        base_files=[
+            "{assignment}/planning/strips.lp",
+            "{assignment}/planning/statues/statues.lp",
+        ],
+        single_agent=False,
+        output_name="statues",
+        project=["exec/2", "exec/3"],
+    ),
+    Task(
+        judge="blocks",
+        instances_dir="./tests/planning/blocks/simple/instances/",
+        base_files=[
+            "{assignment}/planning/strips.lp",
+            "{assignment}/planning/blocks/blocks.lp",
+        ],
+        single_agent=True,
+        output_name="blocks-simple",
+        project=["exec/2", "exec/3"],
+    ),
+    Task(
+        judge="blocks",
+        instances_dir="./tests/planning/blocks/multi/instances/",
+        base_files=[
+            "{assignment}/planning/strips-multiagent.lp",
+            "{assignment}/planning/blocks/blocks-multiagent.lp",
+        ],
+        single_agent=False,
+        output_name="blocks-multi",
+        project=["exec/2", "exec/3"],
+    ),
+    Task(
+        judge="coffee",
+        instances_dir="./tests/planning/coffee/simple/instances/",
+        base_files=[
+            "{assignment}/planning/strips.lp",
+            "./tests/planning/coffee/compat.lp",
+            "{assignment}/planning/coffee/coffee.lp",
+        ],
+        single_agent=True,
+        output_name="coffee-single",
+        project=["exec/2", "exec/3"],
+    ),
+    Task(
+        judge="coffee",
+        instances_dir="./tests/planning/coffee/multi/instances/",
+        base_files=[
+            "{assignment}/planning/strips-multiagent.lp",
+            "./tests/planning/coffee/compat.lp",
+            "{assignment}/planning/coffee/coffee-multiagent.lp",
+        ],
+        single_agent=False,
+        output_name="coffee-multi",
+        project=["exec/2", "exec/3"],
+    ),
+]
+
+
+parser = argparse.ArgumentParser(
+    description="Grade many assignments sharing a single pool of clingo runs."
+)
+parser.add_argument(
+    "assignment_dirs",
+    nargs="+",
+    help="Directories containing the assignments to grade.",
+)
+parser.add_argument(
+    "--tasks",
+    help="JSON file with a list of tasks, replaces the default task table.",
+)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=1,
+    help="Number of clingo runs to execute concurrently, across all assignments.",
+)
+parser.add_argument(
+    "--force",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Grade assignments that already have test results.",
+)
+parser.add_argument(
+    "--incremental",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Only grade the tasks of an assignment whose inputs changed since they were last graded.",
+)
+parser.add_argument(
+    "--backend",
+    choices=judge.BACKENDS.keys(),
+    default="subprocess",
+    help="Run the `clingo` executable, or solve in-process with clingo's python API.",
+)
+parser.add_argument(
+    "--ground_once",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Ground the tests of an instance together when they share their constants (api backend).",
+)
+parser.add_argument(
+    "--cache_dir",
+    help="Directory where to keep clingo results, runs with unchanged inputs are not repeated.",
+)
+parser.add_argument(
+    "--cache_max_mb",
+    type=int,
+    default=1024,
+    help="Size of the result cache, least recently used results are evicted.",
+)
+parser.add_argument(
+    "--invalidate_cache",
+    nargs="*",
+    metavar="OUTPUT_NAME",
+    help="Drop the cached results of these tasks before running, of every task if none is given.",
+)
+parser.add_argument(
+    "--reference",
+    help="Graded reference solution, each test gets a timeout relative to its time.",
+)
+parser.add_argument(
+    "--retry_timeout",
+    type=float,
+    help="Run the tests that time out again, with this timeout.",
+)
+parser.add_argument(
+    "--results_db",
+    help="Append the results to this store instead of writing a JSON file per instance.",
+)
+parser.add_argument(
+    "--memory_limit",
+    type=int,
+    help="Limit the memory of each clingo run, in MiB (subprocess backend).",
+)
+parser.add_argument(
+    "--cpu_limit",
+    type=float,
+    help="Limit the CPU time of each clingo run, in seconds (subprocess backend).",
+)
+parser.add_argument(
+    "--skip_syntax_check",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Run the tests of every task, even if its files of the assignment don't parse.",
+)
+parser.add_argument(
+    "--show_all",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Keep every atom on the models, instead of only the ones the judge validates.",
+)
+parser.add_argument(
+    "--project",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Enumerate the models of tests with MODELS>1 projected onto the `project` predicates of their task.",
+)
+parser.add_argument(
+    "--hardcoded_report",
+    help="Report of `check_instances.py`, the tasks using a flagged file are marked on their log.",
+)
+parser.add_argument(
+    "--skip_hardcoded",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Don't grade the tasks marked by --hardcoded_report.",
+)
+parser.add_argument("--verbose", type=bool, nargs="?", const=True, default=False)
+
+
+def load_tasks(tasks_path: Path) -> List[Task]:
+    with open(tasks_path) as f:
+        return [Task(**task) for task in json.load(f)]
+
+
+def setup(assignment_path: Path, force: bool) -> bool:
+    """Prepares the output directories, returns `False` to skip the assignment."""
+    results_path = assignment_path / "test_results"
+    if results_path.exists() and not force:
+        print("  * Test result directory exists, not touching it...")
+        return False
+
+    if (assignment_path / ".envrc").exists():
+        print("  * Moving .envrc and shell.nix")
+        for name in [".envrc", "shell.nix"]:
+            if (assignment_path / name).exists():
+                (assignment_path / name).rename(assignment_path / (name + ".bak"))
+
+    for name in ["passed", "failed", "logs"]:
+        (results_path / name).mkdir(parents=True, exist_ok=True)
+    return True
+
+
+# Grading settings that change the results of a task
+MANIFEST_SETTINGS = [
+    "backend",
+    "ground_once",
+    "reference",
+    "retry_timeout",
+    "memory_limit",
+    "cpu_limit",
+    "show_all",
+    "project",
+    "skip_hardcoded",
+    "results_db",
+]
+
+
+def file_hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def base_file_hash(assignment_path: Path, base_file: str) -> Optional[str]:
+    """Hash of a file of the assignment, if it exists."""
+    path = Path(base_file.format(assignment=assignment_path))
+    if not path.is_file():
+        return None
+    return file_hash(path)
+
+
+@functools.lru_cache(maxsize=None)
+def tree_hash(path: Path) -> str:
+    """Hash of the names and contents of every file under `path`."""
+    h = hashlib.sha256()
+    for file_path in sorted(p for p in path.rglob("*") if p.is_file()):
+        h.update(str(file_path.relative_to(path)).encode())
+        h.update(file_hash(file_path).encode())
+    return h.hexdigest()
+
+
+def task_inputs(
+    assignment_path: Path,
+    task: Task,
+    args,
+    hardcoded: Dict[str, List[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """Everything the results of `task` depend on, hashed.
+
+    That's the task itself, the files of the assignment it uses, its tests,
+    the grading settings, the results of the reference solution (which set
+    the timeouts), the `hardcoded` findings on its files and the graders
+    themselves.
+    """
+    return {
+        "task": task._asdict(),
+        "settings": {name: getattr(args, name) for name in MANIFEST_SETTINGS},
+        "files": {f: base_file_hash(assignment_path, f) for f in task.base_files},
+        "tests": tree_hash(Path(task.instances_dir)),
+        "reference": reference_hash(args.reference, task),
+        "hardcoded": hashlib.sha256(
+            json.dumps(hardcoded, sort_keys=True).encode()
+        ).hexdigest(),
+        "graders": graders_hash(),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def graders_hash() -> str:
+    """Hash of the modules next to this one that grading imports.
+
+    Scripts that only read the results (e.g. `collect_grades.py`) aren't
+    imported, changing them doesn't regrade anything.
+    """
+    here = Path(__file__).resolve().parent
+    paths = {Path(__file__).resolve()}
+    for module in list(sys.modules.values()):
+        module_path = getattr(module, "__file__", None)
+        if module_path is not None and Path(module_path).resolve().parent == here:
+            paths.add(Path(module_path).resolve())
+
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        h.update(path.name.encode())
+        h.update(file_hash(path).encode())
+    return h.hexdigest()
+
+
+def reference_hash(reference: Optional[str], task: Task) -> Optional[str]:
+    """Hash of the results of the reference solution the timeouts of `task` use."""
+    if reference is None:
+        return None
+    h = hashlib.sha256()
+    results_path = Path(reference) / "test_results"
+    for path in sorted(results_path.glob("*/{}-*.json".format(task.output_name))):
+        h.update(str(path.relative_to(results_path)).encode())
+        h.update(file_hash(path).encode())
+    return h.hexdigest()
+
+
+def load_manifest(assignment_path: Path) -> Dict[str, Any]:
+    """The inputs of each task when it was last graded, by `output_name`."""
+    try:
+        with open(assignment_path / "test_results" / "manifest.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def record_task(assignment_path: Path, task: Task, inputs: Dict[str, Any]):
+    manifest = load_manifest(assignment_path)
+    commit_path = assignment_path / "info_commit.txt"
+    manifest[task.output_name] = {
+        "commit": commit_path.read_text().strip() if commit_path.is_file() else None,
+        "graded_at": time.time(),
+        "inputs": inputs,
+    }
+    with open(assignment_path / "test_results" / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def hardcoded_findings(
+    report: Dict[str, Any], assignment_path: Path, task: Task
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Findings of `check_instances.py` on the files of the assignment `task` uses."""
+    findings = report.get(assignment_path.name, dict())
+    prefix = "{assignment}/"
+    return {
+        name: findings[name]
+        for f in task.base_files
+        if f.startswith(prefix) and (name := f[len(prefix) :]) in findings
+    }
+
+
+def clear_results(output_path: Path, task: Task):
+    """Removes the results of older runs, an instance might not fail/pass anymore."""
+    for old_result in output_path.glob("*/{}-*.json".format(task.output_name)):
+        old_result.unlink()
+    (output_path / "logs" / (task.output_name + ".log")).write_text("")
+
+
+def log_hardcoded(
+    output_path: Path,
+    task: Task,
+    hardcoded: Dict[str, List[Dict[str, Any]]],
+    skipped: bool = False,
+):
+    with open(output_path / "logs" / (task.output_name + ".log"), "a") as log:
+        for (name, findings) in hardcoded.items():
+            for finding in findings:
+                log.write(
+                    "! {}:{} hardcodes {}: {}\n".format(
+                        name,
+                        finding["line"],
+                        finding["predicate"],
+                        finding["statement"],
+                    )
+                )
+        if skipped:
+            log.write("! Not graded, it hardcodes instances (--skip_hardcoded)\n")
+
+
+def task_instances(
+    assignment_path: Path, task: Task, args, result_cache=None, result_store=None
+):
+    output_path = assignment_path / "test_results"
+    clear_results(output_path, task)
+
+    timeouts = dict()
+    if args.reference is not None:
+        timeouts = judge.reference_timeouts(
+            Path(args.reference) / "test_results", task.output_name
+        )
+
+    instance_class = JUDGES[task.judge]
+    base_files = [f.format(assignment=assignment_path) for f in task.base_files]
+    if not args.show_all:
+        base_files.append(
+            show.write_show_file(
+                output_path / "show" / (task.output_name + ".lp"),
+                instance_class.validator_class,
+            )
+        )
+    project_file = None
+    if args.project and task.project:
+        project_file = show.write_project_file(
+            output_path / "project" / (task.output_name + ".lp"), task.project
+        )
+    return [
+        instance_class(
+            instance_dir=instance_dir,
+            assignment_path=assignment_path,
+            output_path=output_path,
+            is_single_agent=task.single_agent,
+            base_files=base_files,
+            output_name=task.output_name,
+            verbose=args.verbose,
+            backend=args.backend,
+            ground_once=args.ground_once,
+            result_cache=result_cache,
+            timeouts=timeouts,
+            retry_timeout=args.retry_timeout,
+            memory_limit=args.memory_limit,
+            cpu_limit=args.cpu_limit,
+            result_store=result_store,
+            project_file=project_file,
+        )
+        for instance_dir in judge.find_instances(Path(task.instances_dir))
+    ]
+
+
+def main():
+    args = parser.parse_args()
+    if args.backend == "api" and not clingo_api.available():
+        parser.error("the api backend needs clingo's python module")
+    if args.ground_once and args.backend != "api":
+        parser.error("--ground_once needs the api backend")
+    if args.backend == "api" and (
+        args.memory_limit is not None or args.cpu_limit is not None
+    ):
+        parser.error("--memory_limit and --cpu_limit need the subprocess backend")
+    tasks = TASKS
+    if args.tasks is not None:
+        tasks = load_tasks(Path(args.tasks))
+
+    result_cache = None
+    if args.cache_dir is not None:
+        result_cache = cache.ResultCache(
+            Path(args.cache_dir), args.cache_max_mb * 1024 * 1024
+        )
+        if args.invalidate_cache is not None:
+            for output_name in args.invalidate_cache or [t.output_name for t in tasks]:
+                result_cache.invalidate(output_name)
+
+    result_store = None
+    if args.results_db is not None:
+        result_store = store.ResultStore(Path(args.results_db), sys.argv)
+
+    hardcoded_report = dict()
+    if args.hardcoded_report is not None:
+        with open(args.hardcoded_report) as f:
+            hardcoded_report = json.load(f)
+
+    instances = []
+    # Instances left to grade and inputs of each task, by (assignment, task)
+    pending_tasks = dict()
+    for assignment_dir in args.assignment_dirs:
+        assignment_path = Path(assignment_dir)
+        print("Grading {}".format(assignment_path))
+        if not setup(assignment_path, args.force or args.incremental):
+            continue
+        manifest = load_manifest(assignment_path)
+        for task in tasks:
+            hardcoded = hardcoded_findings(hardcoded_report, assignment_path, task)
+            inputs = task_inputs(assignment_path, task, args, hardcoded)
+            if args.incremental and (
+                manifest.get(task.output_name, dict()).get("inputs") == inputs
+            ):
+                print("  * {} is up to date".format(task.output_name))
+                continue
+            if hardcoded and args.skip_hardcoded:
+                print("  * {} hardcodes instances, skipping".format(task.output_name))
+                # No results are left from older runs, the task isn't graded
+                output_path = assignment_path / "test_results"
+                clear_results(output_path, task)
+                log_hardcoded(output_path, task, hardcoded, skipped=True)
+                record_task(assignment_path, task, inputs)
+                continue
+            task_list = task_instances(
+                assignment_path, task, args, result_cache, result_store
+            )
+            if hardcoded:
+                print("  * {} hardcodes instances".format(task.output_name))
+                log_hardcoded(assignment_path / "test_results", task, hardcoded)
+            instances += [(assignment_path, task, instance) for instance in task_list]
+            pending_tasks[(assignment_path, task.output_name)] = [
+                len(task_list),
+                inputs,
+            ]
+            if not task_list:
+                record_task(assignment_path, task, inputs)
+
+    t0 = time.time()
+    with judge.executor(args.jobs) as pool:
+        if not args.skip_syntax_check:
+            # Every file is parsed once, tasks that don't parse aren't run.
+            syntax_errors = judge.check_syntax(
+                [f for (_, _, i) in instances for f in i.base_files], pool
+            )
+            for (_, _, instance) in instances:
+                instance.set_syntax_errors(syntax_errors)
+            print(
+                "{} files don't parse, in {:.1f}s".format(
+                    len(syntax_errors), time.time() - t0
+                )
+            )
+
+        for (_, _, instance) in instances:
+            instance.submit(pool)
+        runs = list({run for (_, _, i) in instances for run in i.pending.values()})
+        print("Scheduled {} runs of {} instances".format(len(runs), len(instances)))
+
+        # Results are collected in order, runs keep going in the background.
+        for (assignment_path, task, instance) in instances:
+            instance.test()
+
+            log_path = assignment_path / "test_results" / "logs"
+            with open(log_path / (task.output_name + ".log"), "a") as log:
+                log.write(instance.results_str() + "\n")
+            if args.verbose:
+                print(instance.results_str())
+
+            # Recorded once all of its instances are graded
+            pending = pending_tasks[(assignment_path, task.output_name)]
+            pending[0] -= 1
+            if pending[0] == 0:
+                record_task(assignment_path, task, pending[1])
+
+            result = colored("failed", "red")
+            if instance.test_results["passed"]:
+                result = colored("passed", "green")
+            print(
+                "[{}/{} runs, {:.1f}s] {} {}-{}: {}".format(
+                    sum(1 for run in runs if run.done()),
+                    len(runs),
+                    time.time() - t0,
+                    assignment_path.name,
+                    task.output_name,
+                    instance.instance_name,
+                    result,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 import argparse
+import cache
 import clingo
+import clingo_api
 import json
 import pprint
+import show
+import store
+import sys
 import time
-from typing import Any, Dict, Optional, Sequence
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
 import os
 from termcolor import colored
 from pathlib import Path
+from validator import Validator
 
 
 parser = argparse.ArgumentParser(description="Run tests.")
@@ -30,14 +37,96 @@ parser.add_argument("--base_files", nargs="*", default=[])
 
 parser.add_argument("--verbose", type=bool, nargs="?", const=True, default=False)
 parser.add_argument("--single_agent", type=bool, nargs="?", const=True, default=False)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=1,
+    help="Number of clingo runs to execute concurrently.",
+)
+parser.add_argument(
+    "--backend",
+    choices=["subprocess", "api"],
+    default="subprocess",
+    help="Run the `clingo` executable, or solve in-process with clingo's python API.",
+)
+parser.add_argument(
+    "--ground_once",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Ground the tests of an instance together when they share their constants (api backend).",
+)
+parser.add_argument(
+    "--cache_dir",
+    help="Directory where to keep clingo results, runs with unchanged inputs are not repeated.",
+)
+parser.add_argument(
+    "--cache_max_mb",
+    type=int,
+    default=1024,
+    help="Size of the result cache, least recently used results are evicted.",
+)
+parser.add_argument(
+    "--invalidate_cache",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Drop the cached results of this task (--output_name) before running.",
+)
+
+parser.add_argument(
+    "--reference_results",
+    help="test_results directory of a reference solution, each test gets a timeout relative to its time.",
+)
+parser.add_argument(
+    "--retry_timeout",
+    type=float,
+    help="Run the tests that time out again, with this timeout.",
+)
+parser.add_argument(
+    "--results_db",
+    help="Append the results to this store instead of writing a JSON file per instance.",
+)
+parser.add_argument(
+    "--memory_limit",
+    type=int,
+    help="Limit the memory of each clingo run, in MiB (subprocess backend).",
+)
+parser.add_argument(
+    "--cpu_limit",
+    type=float,
+    help="Limit the CPU time of each clingo run, in seconds (subprocess backend).",
+)
+parser.add_argument(
+    "--project",
+    nargs="+",
+    metavar="NAME/ARITY",
+    help="Enumerate the models of tests with MODELS>1 projected onto these predicates, e.g. exec/2.",
+)
+parser.add_argument(
+    "--skip_syntax_check",
+    type=bool,
+    nargs="?",
+    const=True,
+    default=False,
+    help="Run the tests even if the base files don't parse.",
+)
+
+BACKENDS = {
+    "subprocess": clingo.run,
+    "api": clingo_api.run,
+}
+BACKEND_VERSIONS: Dict[str, Callable[[], str]] = {
+    "subprocess": clingo.version,
+    "api": clingo_api.version,
+}
 
-ARGS = parser.parse_args()
-ASSIGNMENT_PATH = Path(ARGS.assignment_dir)
-INSTANCES_PATH = Path(ARGS.instances_dir)
-OUTPUT_NAME = ARGS.output_name
-OUTPUT_PATH = Path(ARGS.output_dir)
-SINGLE_AGENT = ARGS.single_agent
-VERBOSE = ARGS.verbose
+
+# Timeouts derived from --reference_results, relative to the reference times.
+REFERENCE_FACTOR = 10
+MIN_TIMEOUT = 5  # 5s
 
 
 def parse_constants(test_path: Path):
@@ -68,13 +157,87 @@ def colored_time(time) -> str:
     return colored("{:.3f}s".format(time), color)
 
 
+def executor(jobs: int = 1) -> Executor:
+    """Pool where the clingo runs are scheduled.
+
+    Runs are independent `clingo` processes, so threads are enough to keep
+    `jobs` cores busy.
+    """
+    return ThreadPoolExecutor(max_workers=jobs)
+
+
+def check_syntax(paths: Sequence[str], pool: Executor) -> Dict[str, List[str]]:
+    """Parser errors of each of `paths` that doesn't parse, checked on `pool`.
+
+    Only parses the files, without grounding them, with clingo's python
+    module. Without it nothing is checked, the runs report the errors instead.
+    """
+    if not clingo_api.available():
+        return dict()
+    paths = sorted(set(paths))
+    return {
+        path: errors
+        for (path, errors) in zip(paths, pool.map(clingo_api.parse_errors, paths))
+        if errors
+    }
+
+
+def find_instances(instances_path: Path):
+    return sorted([instances_path / p.name for p in instances_path.glob("*/")])
+
+
+def reference_timeouts(
+    reference_results: Path, output_name: str
+) -> Dict[Tuple[str, str], float]:
+    """Timeouts by `(instance_name, test_name)`, from a reference solution.
+
+    Each test gets `REFERENCE_FACTOR` times the time the reference took, at
+    least `MIN_TIMEOUT` and at most `clingo.DEFAULT_TIMEOUT`. Tests where the
+    reference timed out keep the default.
+    """
+    timeouts = dict()
+    prefix = output_name + "-"
+    for results_path in reference_results.glob("*/{}*.json".format(prefix)):
+        instance_name = results_path.stem[len(prefix) :]
+        with open(results_path) as f:
+            results = json.load(f)
+        for tests in ["positive_tests", "negative_tests"]:
+            for test, run in results[tests].items():
+                if run["timeout"] or run["status"] not in [
+                    str(clingo.Status.SATISFIABLE),
+                    str(clingo.Status.UNSATISFIABLE),
+                ]:
+                    continue
+                timeouts[(instance_name, Path(test).name)] = min(
+                    clingo.DEFAULT_TIMEOUT,
+                    max(MIN_TIMEOUT, REFERENCE_FACTOR * run["time"]),
+                )
+    return timeouts
+
+
 class Instance:
+    # Validator of the models, the predicates its handlers consume are the
+    # ones shown (see `show.py`).
+    validator_class: Optional[Type[Validator]] = None
+
     def __init__(
         self,
         instance_dir: Path,
         assignment_path: Path,
         output_path: Path,
         is_single_agent=False,
+        base_files: Sequence[str] = [],
+        output_name: str = "",
+        verbose=False,
+        backend="subprocess",
+        ground_once=False,
+        result_cache: Optional[cache.ResultCache] = None,
+        timeouts: Dict[Tuple[str, str], float] = {},
+        retry_timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        cpu_limit: Optional[float] = None,
+        result_store: Optional[store.ResultStore] = None,
+        project_file: Optional[str] = None,
     ):
         # assignments/tarea-2-2021-2-$GITHUB_USER/
         self.assignment_path: Path = assignment_path
@@ -109,8 +272,41 @@ class Instance:
 
         self.is_single_agent = is_single_agent
 
+        # From the --base_files flag
+        # assignments/tarea-2-2021-2-$GITHUB_USER/planning/strips.lp ...
+        self.base_files: List[str] = [str(f) for f in base_files]
+        # From the --output_name flag
+        # blocks-multi
+        self.output_name: str = output_name
+        self.verbose: bool = verbose
+        # From the --backend flag
+        self.backend: str = backend
+        # From the --ground_once flag
+        self.ground_once: bool = ground_once
+        # From the --cache_dir flag, results are kept by task (output_name).
+        self.result_cache: Optional[cache.ResultCache] = result_cache
+        # From the --reference_results flag, by (instance_name, test_name)
+        self.timeouts: Dict[Tuple[str, str], float] = timeouts
+        # From the --retry_timeout flag
+        self.retry_timeout: Optional[float] = retry_timeout
+        # From the --memory_limit and --cpu_limit flags
+        self.memory_limit: Optional[int] = memory_limit
+        self.cpu_limit: Optional[float] = cpu_limit
+        # From the --results_db flag
+        self.result_store: Optional[store.ResultStore] = result_store
+        # From the --project flag, `#project` directives of the predicates the
+        # models of a test should differ on
+        self.project_file: Optional[str] = project_file
+        # Parser errors of the base files that don't parse, from
+        # `set_syntax_errors`. With any, the tests fail without running clingo.
+        self.syntax_errors: Dict[str, List[str]] = dict()
+
         self.test_results: Dict[str, Any] = dict()
 
+        # Runs scheduled with `submit`, by test path. Tests grounded together
+        # share their run.
+        self.pending: Dict[str, Future] = dict()
+
     def __str__(self) -> str:
         return "Instance[assignment_path='{}', instance_dir='{}', instance_path='{}', output_path='{}]".format(
             str(self.assignment_path),
@@ -128,6 +324,13 @@ class Instance:
             test_color = "green"
         s = "{}:\n".format(colored(str(self.instance_dir), test_color))
 
+        for path, errors in self.syntax_errors.items():
+            s += "  ! {} doesn't parse, the tests weren't run\n".format(
+                colored(path, "red")
+            )
+            for line in errors:
+                s += "      {}\n".format(line)
+
         # Show positive tests and validate them.
         for name, test in self.test_results["positive_tests"].items():
             s += "  + {}: {} (sols: {} time: {})\n".format(
@@ -148,7 +351,7 @@ class Instance:
                 color = "red"
                 if ver["valid"]:
                     color = "green"
-                if VERBOSE:
+                if self.verbose:
                     s += "      * model {}: {}\n".format(
                         i, colored(", ".join(sol), color)
                     )
@@ -176,7 +379,7 @@ class Instance:
             for i, (sol, ver) in enumerate(
                 zip(test["solutions"], test["verifications"])
             ):
-                if VERBOSE:
+                if self.verbose:
                     s += "      * model {}: {}\n".format(
                         i, colored(", ".join(sol), "red")
                     )
@@ -188,59 +391,322 @@ class Instance:
 
         return s[0:-1]
 
-    def _run_clingo(self, test_path: Path, models: int, constants: Dict):
-        run = clingo.run(
+    def test_settings(self, test_path: Path) -> Tuple[int, float, Dict]:
+        """Models, timeout and constants of a test, from its `%%%` header.
+
+        `%%% TIMEOUT=` takes precedence over the reference timings, and these
+        over `clingo.DEFAULT_TIMEOUT`.
+        """
+        constants = parse_constants(test_path)
+
+        models = 1
+        if "MODELS" in constants:
+            models = int(constants.pop("MODELS"))
+
+        timeout = self.timeouts.get(
+            (self.instance_name, test_path.name), clingo.DEFAULT_TIMEOUT
+        )
+        if "TIMEOUT" in constants:
+            timeout = float(constants.pop("TIMEOUT"))
+        return models, timeout, constants
+
+    def projected(self, models: int) -> bool:
+        """Tests that ask for several models enumerate distinct projections."""
+        return self.project_file is not None and models > 1
+
+    def run_base_files(self, models: int) -> List[str]:
+        if self.project_file is not None and self.projected(models):
+            return self.base_files + [self.project_file]
+        return self.base_files
+
+    def _cache_key(
+        self,
+        test_path: Path,
+        models: int,
+        timeout: float,
+        constants: Dict,
+        grounded_once: bool = False,
+    ) -> str:
+        # Only called with a cache, from `_cached_run` and `_cache_run`
+        assert self.result_cache is not None
+        # Tests grounded together might find other first models than single
+        # runs, and limited runs might run out of memory or CPU time
+        return self.result_cache.key(
+            BACKEND_VERSIONS[self.backend](),
+            clingo.command(
+                [str(self.instance_path), str(test_path)],
+                self.run_base_files(models),
+                models,
+                constants,
+                project=self.projected(models),
+            ),
+            timeout,
+            {
+                "grounded_once": grounded_once,
+                "memory_limit": self.memory_limit,
+                "cpu_limit": self.cpu_limit,
+            },
+        )
+
+    def _cached_run(
+        self,
+        test_path: Path,
+        models: int,
+        timeout: float,
+        constants: Dict,
+        grounded_once: bool = False,
+    ):
+        if self.result_cache is None:
+            return None
+        return self.result_cache.get(
+            self.output_name,
+            self._cache_key(test_path, models, timeout, constants, grounded_once),
+        )
+
+    def _cache_run(
+        self,
+        test_path: Path,
+        models: int,
+        timeout: float,
+        constants: Dict,
+        results,
+        grounded_once: bool = False,
+    ):
+        if self.result_cache is None:
+            return
+        self.result_cache.put(
+            self.output_name,
+            self._cache_key(test_path, models, timeout, constants, grounded_once),
+            results,
+        )
+
+    def _run_clingo(
+        self, test_path: Path, models: int, timeout: float, constants: Dict
+    ):
+        results = self._cached_run(test_path, models, timeout, constants)
+        if results is not None:
+            return results
+
+        results = BACKENDS[self.backend](
             [
                 str(self.instance_path),
                 str(test_path),
             ],
-            base_files=ARGS.base_files,
+            base_files=self.run_base_files(models),
+            timeout=timeout,
             models=models,
             constants=constants,
+            memory_limit=self.memory_limit,
+            cpu_limit=self.cpu_limit,
+            project=self.projected(models),
         )
+        self._cache_run(test_path, models, timeout, constants, results)
+        return results
 
-        if run["status"] == clingo.Status.UNKNOWN:
-            print("=" * 100)
-            print(colored(" ".join(run["args"]), "yellow"))
-            print(colored(run, "magenta"))
-            print("=" * 100)
-
-        return run
+    def _retry(
+        self, test_path: Path, models: int, timeout: float, constants: Dict, results
+    ):
+        """Runs timed out tests again with the --retry_timeout limit."""
+        if (
+            results["status"] != clingo.Status.TIMEOUT
+            or self.retry_timeout is None
+            or self.retry_timeout <= timeout
+        ):
+            return results
+        return self._run_clingo(test_path, models, self.retry_timeout, constants)
 
     def verify(self, solution) -> Dict[str, Any]:
+        if self.validator_class is None:
+            return {
+                "instance_summary": "",
+                "valid": True,
+                "logs": [],
+            }
+        return self.verification(self.validator_class(solution), solution)
+
+    def verify_all(self, solutions) -> List[Dict[str, Any]]:
+        """Verifications of the models of a test, validated together (`batch`)."""
+        if self.validator_class is None:
+            return [self.verify(sol) for sol in solutions]
+        return [
+            self.verification(v, solution)
+            for (v, solution) in zip(self.validator_class.batch(solutions), solutions)
+        ]
+
+    def summary(self, v) -> str:
+        """The instance as seen by the validator `v`, aligned on `results_str`."""
+        return v.instance_summary(sep="\n" + " " * 26)
+
+    def verification(self, v, solution) -> Dict[str, Any]:
         return {
-            "instance_summary": "",
-            "valid": True,
-            "logs": [],
+            "instance_summary": self.summary(v),
+            "valid": len(solution) > 0 and v.is_valid(),
+            "logs": "\n                 > ".join(v.coloured_logs()),
         }
 
-    def run_and_verify(self, test_path: Path):
-        constants = parse_constants(test_path)
+    def set_syntax_errors(self, syntax_errors: Dict[str, List[str]]):
+        """Keeps the errors of `check_syntax` on the base files of this instance."""
+        self.syntax_errors = {
+            f: syntax_errors[f] for f in self.base_files if f in syntax_errors
+        }
 
-        models = 1
-        if "MODELS" in constants:
-            models = int(constants.pop("MODELS"))
+    def syntax_error_run(self, test_path: Path, models: int, constants: Dict):
+        """Results of a test whose base files don't parse, without running it."""
+        return {
+            "args": clingo.command(
+                [str(self.instance_path), str(test_path)],
+                self.run_base_files(models),
+                models,
+                constants,
+                project=self.projected(models),
+            ),
+            "time": 0.0,
+            "timeout": False,
+            "status": clingo.Status.SYNTAX_ERROR,
+            "solutions": [],
+            "truncated": False,
+            "stdout": [],
+            "stderr": [
+                line for errors in self.syntax_errors.values() for line in errors
+            ],
+            "phases": dict(),
+            "statistics": dict(),
+        }
 
-        results = self._run_clingo(test_path, models, constants)
-        results["verifications"] = [self.verify(sol) for sol in results["solutions"]]
+    def run(self, test_path: Path):
+        start_time = time.time()
+        models, timeout, constants = self.test_settings(test_path)
+        if self.syntax_errors:
+            results = self.syntax_error_run(test_path, models, constants)
+            results["start_time"] = start_time
+            results["finish_time"] = time.time()
+            return results
+
+        results = self._run_clingo(test_path, models, timeout, constants)
+        results = self._retry(test_path, models, timeout, constants, results)
+        results["start_time"] = start_time
+        results["finish_time"] = time.time()
+        return results
+
+    def verify_run(self, results):
+        if results["status"] == clingo.Status.UNKNOWN:
+            print("=" * 100)
+            print(colored(" ".join(results["args"]), "yellow"))
+            print(colored(results, "magenta"))
+            print("=" * 100)
+
+        t0 = time.time()
+        results["verifications"] = self.verify_all(list(results["solutions"]))
         results["verified"] = all([ver["valid"] for ver in results["verifications"]])
+        results["phases"] = dict(
+            results.get("phases", dict()), validate=time.time() - t0
+        )
         return results
 
+    def run_and_verify(self, test_path: Path):
+        return self.verify_run(self.run(test_path))
+
+    def test_groups(self) -> List[List[Path]]:
+        """Tests that can be grounded together, sharing constants and projection."""
+        tests = self.positive_tests + self.negative_tests
+        if not self.ground_once:
+            return [[test] for test in tests]
+
+        groups: Dict[Tuple, List[Path]] = dict()
+        for test in tests:
+            models, _timeout, constants = self.test_settings(test)
+            key = (self.projected(models),) + tuple(sorted(constants.items()))
+            groups.setdefault(key, []).append(test)
+        return list(groups.values())
+
+    def run_group(self, test_paths: List[Path]) -> Dict[str, Any]:
+        if len(test_paths) == 1:
+            return {str(test_paths[0]): self.run(test_paths[0])}
+
+        start_time = time.time()
+        tests = []
+        group_results = dict()
+        for test_path in test_paths:
+            models, timeout, constants = self.test_settings(test_path)
+
+            results = self._cached_run(
+                test_path, models, timeout, constants, grounded_once=True
+            )
+            if results is not None:
+                results["start_time"] = start_time
+                results["finish_time"] = time.time()
+                group_results[str(test_path)] = results
+            else:
+                tests.append((str(test_path), models, timeout))
+
+        if not tests:
+            return group_results
+
+        # The tests of a group share their constants and their projection
+        runs = clingo_api.run_grounded_once(
+            [str(self.instance_path)],
+            tests,
+            base_files=self.run_base_files(models),
+            constants=constants,
+            project=self.projected(models),
+        )
+        for ((test, models, timeout), results) in zip(tests, runs):
+            self._cache_run(
+                Path(test), models, timeout, constants, results, grounded_once=True
+            )
+            results = self._retry(Path(test), models, timeout, constants, results)
+            results["start_time"] = start_time
+            results["finish_time"] = time.time()
+            group_results[test] = results
+        return group_results
+
+    def submit(self, executor: Executor):
+        """Schedules the clingo runs of every test on `executor`.
+
+        Only the runs happen on the pool, verification and output happen on
+        `test`, in test order, so results don't depend on which run finishes
+        first.
+        """
+        if self.test_results or self.pending:
+            return
+
+        if self.syntax_errors:
+            # Failed already, `test` fills in the results.
+            return
+        for tests in self.test_groups():
+            future = executor.submit(self.run_group, tests)
+            for test in tests:
+                self.pending[str(test)] = future
+
+    def _collect(self, test_path: Path):
+        future = self.pending.get(str(test_path))
+        if future is None:
+            return self.run_and_verify(test_path)
+        return self.verify_run(future.result()[str(test_path)])
+
     def test(self) -> Dict:
         if self.test_results:
             return self.test_results
 
-        t0 = time.time()
         self.test_results = {
             "instance": str(self.instance_path),
             "positive_tests": {
-                str(test): self.run_and_verify(test) for test in self.positive_tests
+                str(test): self._collect(test) for test in self.positive_tests
             },
             "negative_tests": {
-                str(test): self.run_and_verify(test) for test in self.negative_tests
+                str(test): self._collect(test) for test in self.negative_tests
             },
         }
-        self.test_results["instance_time"] = time.time() - t0
+        self.pending = dict()
+        # From the first run starting, runs may have waited on a shared pool
+        runs = [
+            run
+            for tests in ["positive_tests", "negative_tests"]
+            for run in self.test_results[tests].values()
+        ]
+        self.test_results["instance_time"] = max(
+            [run["finish_time"] for run in runs], default=0.0
+        ) - min([run["start_time"] for run in runs], default=0.0)
 
         self.test_results["tested"] = (
             len(self.test_results["positive_tests"])
@@ -264,57 +730,151 @@ class Instance:
         if self.test_results["passed"]:
             run_output = self.passed_output_path
         instance_name = os.path.basename(self.instance_dir)
-        run_output = run_output / (OUTPUT_NAME + "-" + instance_name + ".json")
+        run_output = run_output / (self.output_name + "-" + instance_name + ".json")
+
+        record = {
+            "instance": self.test_results["instance"],
+            "positive_tests": {
+                str(k): {
+                    "args": [str(part) for part in v["args"]],
+                    "status": str(v["status"]),
+                    "time": v["time"],
+                    "timeout": v["timeout"],
+                    "solutions": v["solutions"],
+                    "truncated": v.get("truncated", False),
+                    "stdout": v["stdout"],
+                    "stderr": v["stderr"],
+                    "verified": v["verified"],
+                    "verifications": v["verifications"],
+                    "phases": v.get("phases", dict()),
+                    "statistics": v.get("statistics", dict()),
+                }
+                for k, v in self.test_results["positive_tests"].items()
+            },
+            "negative_tests": {
+                str(k): {
+                    "args": [str(part) for part in v["args"]],
+                    "status": str(v["status"]),
+                    "time": v["time"],
+                    "timeout": v["timeout"],
+                    "solutions": v["solutions"],
+                    "truncated": v.get("truncated", False),
+                    "stdout": v["stdout"],
+                    "stderr": v["stderr"],
+                    "verified": v["verified"],
+                    "verifications": v["verifications"],
+                    "phases": v.get("phases", dict()),
+                    "statistics": v.get("statistics", dict()),
+                }
+                for k, v in self.test_results["negative_tests"].items()
+            },
+            "instance_time": self.test_results["instance_time"],
+            "syntax_errors": (
+                any(
+                    t["status"] == clingo.Status.SYNTAX_ERROR
+                    for t in self.test_results["positive_tests"].values()
+                )
+                or any(
+                    t["status"] == clingo.Status.SYNTAX_ERROR
+                    for t in self.test_results["negative_tests"].values()
+                )
+            ),
+            "tested": self.test_results["tested"],
+            "passed": self.test_results["passed"],
+        }
+
+        if self.result_store is not None:
+            print(colored("Storing '{}'".format(run_output.stem), "cyan"))
+            self.test_results["write_time"] = self.result_store.add(
+                self.assignment_path.name, run_output.stem, record
+            )
+            return self.test_results
 
         print(colored("Writing '{}'".format(run_output), "cyan"))
 
+        # The time to write the results is only known once they're written, so
+        # it's appended as the last field of the record
+        t0 = time.time()
         with open(run_output, "w") as f:
-            json.dump(
-                {
-                    "instance": self.test_results["instance"],
-                    "positive_tests": {
-                        str(k): {
-                            "args": [str(part) for part in v["args"]],
-                            "status": str(v["status"]),
-                            "time": v["time"],
-                            "timeout": v["timeout"],
-                            "solutions": v["solutions"],
-                            "stdout": v["stdout"],
-                            "stderr": v["stderr"],
-                            "verified": v["verified"],
-                            "verifications": v["verifications"],
-                        }
-                        for k, v in self.test_results["positive_tests"].items()
-                    },
-                    "negative_tests": {
-                        str(k): {
-                            "args": [str(part) for part in v["args"]],
-                            "status": str(v["status"]),
-                            "time": v["time"],
-                            "timeout": v["timeout"],
-                            "solutions": v["solutions"],
-                            "stdout": v["stdout"],
-                            "stderr": v["stderr"],
-                            "verified": v["verified"],
-                            "verifications": v["verifications"],
-                        }
-                        for k, v in self.test_results["negative_tests"].items()
-                    },
-                    "instance_time": self.test_results["instance_time"],
-                    "syntax_errors": (
-                        any(
-                            t["status"] == clingo.Status.SYNTAX_ERROR
-                            for t in self.test_results["positive_tests"].values()
-                        )
-                        or any(
-                            t["status"] == clingo.Status.SYNTAX_ERROR
-                            for t in self.test_results["negative_tests"].values()
-                        )
-                    ),
-                    "tested": self.test_results["tested"],
-                    "passed": self.test_results["passed"],
-                },
-                f,
+            f.write(json.dumps(record)[:-1])
+            f.flush()
+            self.test_results["write_time"] = time.time() - t0
+            f.write(
+                ', "write_time": {}}}'.format(
+                    json.dumps(self.test_results["write_time"])
+                )
             )
 
         return self.test_results
+
+
+def main(instance_class):
+    """Entry point of the problem-specific judges."""
+    args = parser.parse_args()
+    if args.backend == "api" and not clingo_api.available():
+        parser.error("the api backend needs clingo's python module")
+    if args.ground_once and args.backend != "api":
+        parser.error("--ground_once needs the api backend")
+    if args.backend == "api" and (
+        args.memory_limit is not None or args.cpu_limit is not None
+    ):
+        parser.error("--memory_limit and --cpu_limit need the subprocess backend")
+    output_path = Path(args.output_dir)
+    result_cache = None
+    if args.cache_dir is not None:
+        result_cache = cache.ResultCache(
+            Path(args.cache_dir), args.cache_max_mb * 1024 * 1024
+        )
+        if args.invalidate_cache:
+            result_cache.invalidate(args.output_name)
+    timeouts = dict()
+    if args.reference_results is not None:
+        timeouts = reference_timeouts(Path(args.reference_results), args.output_name)
+
+    result_store = None
+    if args.results_db is not None:
+        result_store = store.ResultStore(Path(args.results_db), sys.argv)
+
+    output_path.mkdir(parents=True, exist_ok=True)
+    print("Output path: ", output_path)
+
+    project_file = None
+    if args.project is not None:
+        project_file = show.write_project_file(
+            output_path / "project" / (args.output_name + ".lp"), args.project
+        )
+
+    instances = [
+        instance_class(
+            instance_dir=instance_dir,
+            assignment_path=Path(args.assignment_dir),
+            output_path=output_path,
+            is_single_agent=args.single_agent,
+            base_files=args.base_files,
+            output_name=args.output_name,
+            verbose=args.verbose,
+            backend=args.backend,
+            ground_once=args.ground_once,
+            result_cache=result_cache,
+            timeouts=timeouts,
+            retry_timeout=args.retry_timeout,
+            memory_limit=args.memory_limit,
+            cpu_limit=args.cpu_limit,
+            result_store=result_store,
+            project_file=project_file,
+        )
+        for instance_dir in find_instances(Path(args.instances_dir))
+    ]
+
+    with executor(args.jobs) as pool:
+        if not args.skip_syntax_check:
+            syntax_errors = check_syntax(args.base_files, pool)
+            for instance in instances:
+                instance.set_syntax_errors(syntax_errors)
+
+        for instance in instances:
+            instance.submit(pool)
+
+        for instance in instances:
+            instance.test()
+            print(instance.results_str())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import argparse
+from pathlib import Path
+from typing import List
+
+
+parser = argparse.ArgumentParser(
+    description="Print a program that shows only the atoms a judge validates."
+)
+parser.add_argument("judge", help="One of the judges of `grade.py`, e.g. statues.")
+
+
+def show_program(validator_class) -> str:
+    """`#show` directives for the predicates the handlers of `validator_class` consume.
+
+    Passed as a base file, clingo only prints those atoms instead of every
+    auxiliary atom of the assignment. They're `#defined` too, as clingo warns
+    about shown predicates without atoms otherwise.
+    """
+    predicates = validator_class.shown_predicates()
+    return (
+        "% Generated by show.py from {}\n\n".format(validator_class.__name__)
+        + "".join("#defined {}/{}.\n".format(*p) for p in predicates)
+        + "\n"
+        + "".join("#show {}/{}.\n".format(*p) for p in predicates)
+    )
+
+
+def write_show_file(path: Path, validator_class) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(show_program(validator_class))
+    return str(path)
+
+
+def project_program(predicates: List[str]) -> str:
+    """`#project` directives for `name/arity` predicates, e.g. `exec/2`.
+
+    With `clingo --project`, models that only differ on other atoms are
+    enumerated only once.
+    """
+    return (
+        "% Generated by show.py\n\n"
+        + "".join("#defined {}.\n".format(p) for p in predicates)
+        + "\n"
+        + "".join("#project {}.\n".format(p) for p in predicates)
+    )
+
+
+def write_project_file(path: Path, predicates: List[str]) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(project_program(predicates))
+    return str(path)
+
+
+def main():
+    # `grade` imports this module
+    import grade
+
+    args = parser.parse_args()
+    if args.judge not in grade.JUDGES:
+        parser.error("judge should be one of {}".format(", ".join(grade.JUDGES)))
+    print(show_program(grade.JUDGES[args.judge].validator_class), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import copy
+
+from log import LogLevel
+from symbols import Interner
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+# Kinds of action definitions, by predicate
+PPRE = "action_ppre"
+NPRE = "action_npre"
+ADD = "action_add"
+DEL = "action_del"
+
+
+class StripsSimulator:
+    """Runs a plan over the STRIPS definitions of a model.
+
+    Fluents and actions are interned, states and the preconditions and effects
+    of each action are bitsets. At each time step the preconditions of every
+    executed action are checked against the state, then all their deletes and
+    adds are applied at once.
+    """
+
+    def __init__(self):
+        self.fluents = Interner()
+        self.actions = Interner()
+        # Bitsets of fluents, by kind and action id
+        self.definitions: Dict[str, List[int]] = {
+            kind: [] for kind in [PPRE, NPRE, ADD, DEL]
+        }
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __copy__(self):
+        """Shares the definitions, names are interned by each copy on its own."""
+        simulator = StripsSimulator.__new__(StripsSimulator)
+        simulator.fluents = copy.copy(self.fluents)
+        simulator.actions = copy.copy(self.actions)
+        simulator.definitions = self.definitions
+        return simulator
+
+    def action_id(self, action: str) -> int:
+        action_id = self.actions.id(action)
+        for masks in self.definitions.values():
+            if len(masks) <= action_id:
+                masks.append(0)
+        return action_id
+
+    def define(self, kind: str, action: str, fluent: str):
+        self.definitions[kind][self.action_id(action)] |= self.fluents.bit(fluent)
+
+    def has_action(self, action: str) -> bool:
+        return action in self.actions.ids
+
+    def simulate(
+        self,
+        start: Iterable[str],
+        plan: List[List[Tuple[str, str]]],
+        goal: Iterable[str],
+        holds: Optional[Sequence[Iterable[str]]] = None,
+        declared_actions: Set[str] = set(),
+        check_goal: bool = True,
+    ) -> List[Tuple[LogLevel, str]]:
+        """Checks a plan of `(agent_name, action)` per time step.
+
+        Executing an action without its positive/negative preconditions, or
+        not reaching the goal are errors. States that differ from the `holds`
+        of the model are only warned about, as models may derive extra fluents.
+        Actions that are declared (`action/1`) but not defined are no-ops, the
+        goal isn't checked if there's actions that are neither.
+        """
+        logs: List[Tuple[LogLevel, str]] = []
+        ppre, npre, add, delete = [self.definitions[k] for k in [PPRE, NPRE, ADD, DEL]]
+
+        state = self.fluents.mask(start)
+        unknown_actions: Set[str] = set()
+        holds_warned = False
+        for t, instant_plan in enumerate(plan):
+            if holds is not None and not holds_warned:
+                holds_warned = self.check_holds(t, state, holds, logs)
+
+            adds = 0
+            deletes = 0
+            for (agent_name, action) in instant_plan:
+                if not self.has_action(action):
+                    if action not in declared_actions:
+                        unknown_actions.add(action)
+                    continue
+
+                a = self.actions.ids[action]
+                if (missing := ppre[a] & ~state) != 0:
+                    logs.append(
+                        (
+                            LogLevel.ERROR,
+                            "'{}' executes {} at t={}, but [{}] don't hold.".format(
+                                agent_name,
+                                action,
+                                t,
+                                ", ".join(self.fluents.unmask(missing)),
+                            ),
+                        )
+                    )
+                if (forbidden := npre[a] & state) != 0:
+                    logs.append(
+                        (
+                            LogLevel.ERROR,
+                            "'{}' executes {} at t={}, but [{}] hold.".format(
+                                agent_name,
+                                action,
+                                t,
+                                ", ".join(self.fluents.unmask(forbidden)),
+                            ),
+                        )
+                    )
+                adds |= add[a]
+                deletes |= delete[a]
+
+            state = (state & ~deletes) | adds
+
+        if holds is not None and not holds_warned:
+            self.check_holds(len(plan), state, holds, logs)
+
+        if not check_goal:
+            return logs
+
+        if unknown_actions:
+            logs.append(
+                (
+                    LogLevel.WARNING,
+                    "Executed actions without definitions: [{}], the goal can't be checked.".format(
+                        ", ".join(sorted(unknown_actions))
+                    ),
+                )
+            )
+            return logs
+
+        if (unreached := self.fluents.mask(goal) & ~state) != 0:
+            logs.append(
+                (
+                    LogLevel.ERROR,
+                    "The plan doesn't reach the goal, [{}] don't hold at t={}.".format(
+                        ", ".join(self.fluents.unmask(unreached)), len(plan)
+                    ),
+                )
+            )
+
+        return logs
+
+    def check_holds(
+        self, t: int, state: int, holds: Sequence[Iterable[str]], logs
+    ) -> bool:
+        """Warns about the first time where the model's `holds` isn't `state`."""
+        if t >= len(holds):
+            return False
+        expected = self.fluents.known_mask(holds[t])
+        if expected == state:
+            return False
+        logs.append(
+            (
+                LogLevel.WARNING,
+                "At t={} `holds` differs from the simulated plan, extra: [{}], missing: [{}].".format(
+                    t,
+                    ", ".join(self.fluents.unmask(expected & ~state)),
+                    ", ".join(self.fluents.unmask(state & ~expected)),
+                ),
+            )
+        )
+        return True
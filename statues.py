@@ -1,34 +1,36 @@
 #!/usr/bin/env python
 
-from logging import LogLevel
+from log import LogLevel
 import judge
 import os
-import re
 
 from pathlib import Path
+from typing import List, Set
 from strips import StripsValidator
+from validator import handles, parse_term
 
 
-INSTANCES_PATH = judge.INSTANCES_PATH
-OUTPUT_PATH = judge.OUTPUT_PATH
-
-
-# Parse expressions
-AT_POS = re.compile(r"^at\((?P<x>\d+)\)$")
-IS_RED = re.compile(r"^isRed\((?P<t>\d+)\)$")
-
-# PROBLEM
-COORDS = re.compile(r"^x\((?P<t>\d+)\)$")
-
-# ACTIONS
-MOVE = re.compile(r"^move\((?P<args>.*)\)$")
-WAIT = re.compile(r"^wait\((?P<args>.*)\)$")
+def at_position(f):
+    """Position of an `at(X)` fluent, `None` for other fluents."""
+    (name, args) = parse_term(f)
+    if name == "at" and len(args) == 1 and args[0].isdigit():
+        return int(args[0])
+    return None
 
 
 class StatuesValidator(StripsValidator):
-    def __init__(self, solution):
-        super().__init__(solution)
-
+    __slots__ = [
+        "start_pos",
+        "end_pos",
+        "is_red",
+        "steps",
+        "pauses",
+        "unexpected_actions",
+    ]
+
+    STATIC_ATTRIBUTES = StripsValidator.STATIC_ATTRIBUTES + ["is_red"]
+
+    def __init__(self, solution, context=None):
         self.start_pos: int = -1
         self.end_pos: int = -1
 
@@ -39,13 +41,13 @@ class StatuesValidator(StripsValidator):
         # Times at which we plan to wait
         self.pauses: List[int] = []
 
+        super().__init__(solution, context)
+
         for f in self.start:
-            if (m := AT_POS.search(f)) is not None:
-                pos = int(m.group("x"))
+            if (pos := at_position(f)) is not None:
                 self.start_pos = pos
         for f in self.goal:
-            if (m := AT_POS.search(f)) is not None:
-                pos = int(m.group("x"))
+            if (pos := at_position(f)) is not None:
                 self.end_pos = pos
 
         self.unexpected_actions = set()
@@ -61,17 +63,16 @@ class StatuesValidator(StripsValidator):
                     else:
                         self.unexpected_actions.add(a.name)
 
-        for pred in self.solution:
-            skipped = False
-            if (m := IS_RED.search(pred)) is not None:
-                self.is_red.add(int(m.group("t")))
-            elif (m := COORDS.search(pred)) is not None:
-                pass
-            else:
-                skipped = True
-            if not skipped:
-                if pred not in self.parsed_predicates:
-                    self.parsed_predicates.add(pred)
+    @handles("isRed", 1, static=True)
+    def parse_is_red(self, t):
+        if not t.isdigit():
+            return False
+        self.is_red.add(int(t))
+
+    @handles("x", 1, static=True)
+    def parse_coords(self, x):
+        if not x.isdigit():
+            return False
 
     def verify(self):
         logs = []
@@ -167,31 +168,11 @@ class StatuesValidator(StripsValidator):
 
 
 class StatuesInstance(judge.Instance):
-    def verify(self, solution):
-        v = StatuesValidator(solution)
-        return {
-            "instance_summary": v.instance_summary(sep="\n" + " "*26),
-            "valid": len(solution) > 0 and v.is_valid(),
-            "logs": "\n                 > ".join(v.coloured_logs()),
-        }
+    validator_class = StatuesValidator
 
 
 def main():
-    OUTPUT_PATH.mkdir(parents=True, exist_ok=True)
-    print("Output path: ", OUTPUT_PATH)
-
-    for instance_dir in sorted(
-        [INSTANCES_PATH / p.name for p in INSTANCES_PATH.glob("*/")]
-    ):
-        instance = StatuesInstance(
-            instance_dir=instance_dir,
-            assignment_path=judge.ASSIGNMENT_PATH,
-            output_path=OUTPUT_PATH,
-            is_single_agent=judge.SINGLE_AGENT,
-        )
-
-        instance.test()
-        print(instance.results_str())
+    judge.main(StatuesInstance)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+# Columns of each test, the rest of its results are compressed in `outputs`.
+TEST_COLUMNS = ["status", "time", "timeout", "verified", "phases", "statistics"]
+# Columns stored as JSON
+JSON_COLUMNS = ["phases", "statistics"]
+INSTANCE_COLUMNS = [
+    "instance",
+    "instance_time",
+    "write_time",
+    "syntax_errors",
+    "tested",
+    "passed",
+]
+# Kinds of tests, as on the results of an instance
+TEST_KINDS = ["positive_tests", "negative_tests"]
+# Columns stored as integers
+BOOL_COLUMNS = ["timeout", "verified", "syntax_errors", "tested", "passed"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    start_time REAL NOT NULL,
+    args TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS instances (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    submission TEXT NOT NULL,
+    name TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    instance_time REAL,
+    write_time REAL,
+    syntax_errors INTEGER NOT NULL,
+    tested INTEGER NOT NULL,
+    passed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS instances_by_submission ON instances (submission, name);
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    instance_id INTEGER NOT NULL REFERENCES instances(id),
+    kind TEXT NOT NULL,
+    test TEXT NOT NULL,
+    status TEXT NOT NULL,
+    time REAL,
+    timeout INTEGER NOT NULL,
+    verified INTEGER,
+    phases TEXT,
+    statistics TEXT
+);
+CREATE INDEX IF NOT EXISTS tests_by_instance ON tests (instance_id);
+CREATE TABLE IF NOT EXISTS outputs (
+    test_id INTEGER PRIMARY KEY REFERENCES tests(id),
+    data BLOB NOT NULL
+);
+"""
+
+
+def from_row(columns: List[str], row) -> Dict[str, Any]:
+    values = dict(zip(columns, row))
+    for c in columns:
+        if values[c] is None:
+            continue
+        if c in JSON_COLUMNS:
+            values[c] = json.loads(values[c])
+        elif c in BOOL_COLUMNS:
+            values[c] = bool(values[c])
+    return values
+
+
+class ResultStore:
+    """The results of every instance of a grading run, in a SQLite database.
+
+    The store is append-only, each process that opens it starts a new run and
+    the latest results of an instance are the ones that count. The columns
+    reports need are kept on their own, the rest of the results of each test
+    (args, models, stdout, ...) are compressed JSON in `outputs`.
+    """
+
+    def __init__(self, path: Path, args: List[str] = []):
+        self.path = path
+        self.lock = threading.Lock()
+        # Judges of several assignments may write at the same time
+        self.db = sqlite3.connect(str(path), timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.executescript(SCHEMA)
+        self.run_id: Optional[int] = None
+        self.args = args
+
+    def close(self):
+        self.db.close()
+
+    def add(self, submission: str, name: str, results: Dict[str, Any]) -> float:
+        """Appends the results of an instance, as written on its JSON file.
+
+        Returns the time it took, which is stored as its `write_time`.
+        """
+        t0 = time.time()
+        with self.lock, self.db:
+            if self.run_id is None:
+                self.run_id = self.db.execute(
+                    "INSERT INTO runs (start_time, args) VALUES (?, ?)",
+                    (time.time(), json.dumps(self.args)),
+                ).lastrowid
+            instance_id = self.db.execute(
+                "INSERT INTO instances (run_id, submission, name, {}) VALUES (?, ?, ?, {})".format(
+                    ", ".join(INSTANCE_COLUMNS),
+                    ", ".join("?" for _ in INSTANCE_COLUMNS),
+                ),
+                [self.run_id, submission, name]
+                + [results.get(c) for c in INSTANCE_COLUMNS],
+            ).lastrowid
+            for kind in TEST_KINDS:
+                for (test, test_results) in results[kind].items():
+                    test_id = self.db.execute(
+                        "INSERT INTO tests (instance_id, kind, test, {}) VALUES (?, ?, ?, {})".format(
+                            ", ".join(TEST_COLUMNS),
+                            ", ".join("?" for _ in TEST_COLUMNS),
+                        ),
+                        [instance_id, kind, test]
+                        + [
+                            json.dumps(test_results[c])
+                            if c in JSON_COLUMNS
+                            else test_results[c]
+                            for c in TEST_COLUMNS
+                        ],
+                    ).lastrowid
+                    outputs = {
+                        k: v for (k, v) in test_results.items() if k not in TEST_COLUMNS
+                    }
+                    self.db.execute(
+                        "INSERT INTO outputs (test_id, data) VALUES (?, ?)",
+                        (test_id, zlib.compress(json.dumps(outputs).encode())),
+                    )
+            write_time = time.time() - t0
+            self.db.execute(
+                "UPDATE instances SET write_time = ? WHERE id = ?",
+                (write_time, instance_id),
+            )
+        return write_time
+
+    def _latest(self, submission: str, name: Optional[str] = None):
+        """Ids, names and columns of the latest results of each instance."""
+        query = """
+            SELECT id, name, {} FROM instances
+            WHERE id IN (
+                SELECT MAX(id) FROM instances
+                WHERE submission = ? AND (? IS NULL OR name = ?)
+                GROUP BY name
+            )
+            ORDER BY name
+        """.format(
+            ", ".join(INSTANCE_COLUMNS)
+        )
+        return self.db.execute(query, (submission, name, name)).fetchall()
+
+    def instances(
+        self, submission: str, test_columns: List[str] = TEST_COLUMNS
+    ) -> Dict[str, Dict[str, Any]]:
+        """The latest results of each instance of `submission`, by name.
+
+        Tests only have the `test_columns`, without their outputs.
+        """
+        instances = dict()
+        for row in self._latest(submission):
+            instance = from_row(INSTANCE_COLUMNS, row[2:])
+            instance.update({kind: dict() for kind in TEST_KINDS})
+            instances[row[1]] = (row[0], instance)
+
+        by_id = {
+            instance_id: instance for (instance_id, instance) in instances.values()
+        }
+        if by_id:
+            query = "SELECT instance_id, kind, test, {} FROM tests WHERE instance_id IN ({}) ORDER BY id".format(
+                ", ".join(test_columns), ", ".join("?" for _ in by_id)
+            )
+            for row in self.db.execute(query, list(by_id)):
+                by_id[row[0]][row[1]][row[2]] = from_row(test_columns, row[3:])
+        return {name: instance for (name, (_, instance)) in instances.items()}
+
+    def instance(self, submission: str, name: str) -> Optional[Dict[str, Any]]:
+        """The latest results of an instance, with their outputs, as on its JSON file."""
+        rows = self._latest(submission, name)
+        if not rows:
+            return None
+        instance_id = rows[0][0]
+        instance = from_row(INSTANCE_COLUMNS, rows[0][2:])
+        instance.update({kind: dict() for kind in TEST_KINDS})
+        query = """
+            SELECT kind, test, {}, data FROM tests JOIN outputs ON tests.id = test_id
+            WHERE instance_id = ? ORDER BY tests.id
+        """.format(
+            ", ".join("tests." + c for c in TEST_COLUMNS)
+        )
+        for row in self.db.execute(query, (instance_id,)):
+            test = from_row(TEST_COLUMNS, row[2:-1])
+            test.update(json.loads(zlib.decompress(row[-1])))
+            instance[row[0]][row[1]] = test
+        return instance
+
+
+parser = argparse.ArgumentParser(description="Show results from a results store.")
+parser.add_argument("results_db", help="The store, from --results_db.")
+parser.add_argument("submission", help="e.g. tarea-2-2021-2-$GITHUB_USER")
+parser.add_argument("name", nargs="?", help="e.g. dh-0, all of them otherwise.")
+
+
+def main():
+    args = parser.parse_args()
+    result_store = ResultStore(Path(args.results_db))
+    if args.name is None:
+        json.dump(result_store.instances(args.submission), sys.stdout)
+    else:
+        json.dump(result_store.instance(args.submission, args.name), sys.stdout)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,45 @@
 #!/usr/bin/env python
 
 import fileinput
-import re
 
+from array import array
+from log import LogLevel
+from simulator import ADD, DEL, NPRE, PPRE, StripsSimulator
+from symbols import SYMBOLS
 from termcolor import colored
-from typing import Set
-from validator import Validator
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from validator import Validator, handles, parse_term
 
-# STRIPS
-TIME = re.compile(r"^time\((?P<t>\d+)\)$")
-START = re.compile(r"^start\((?P<f>.*)\)$")
-GOAL = re.compile(r"^goal\((?P<f>.*)\)$")
-FLUENT = re.compile(r"^fluent\((?P<f>.*)\)$")
-FLUENT_DROPPED = re.compile(r"^fluent_dropped\((?P<f>.*)\)$")
-AGENT = re.compile(r"^agent\((?P<agent>.*)\)$")
-ACTION = re.compile(r"^action\((?P<action>.*)\)$")
-ACTION_PPRE = re.compile(r"^action_ppre\((?P<action>.*)\)$")
-ACTION_NPRE = re.compile(r"^action_npre\((?P<action>.*)\)$")
-ACTION_ADD = re.compile(r"^action_add\((?P<action>.*)\)$")
-ACTION_DEL = re.compile(r"^action_del\((?P<action>.*)\)$")
-HOLDS = re.compile(r"^holds\((?P<t>\d+),(?P<f>.*)\)$")
-EXEC_SINGLE = re.compile(r"^exec\((?P<time>\d+),(?P<action>.*)\)$")
-EXEC_MULTI = re.compile(r"^exec\((?P<time>\d+),(?P<agent>\w+),(?P<action>.*)\)$")
 
-
-PREDICATE = re.compile(r"^(?P<name>\w+)\((?P<args>.*)\)$")
+def agent_action(*action) -> str:
+    """`(agent,action)`, as clingo prints tuples, or just `action`."""
+    if len(action) == 1:
+        return action[0]
+    return "({})".format(",".join(action))
 
 
 class Action:
+    __slots__ = ["raw", "name", "args", "arguments"]
+
+    # Actions are immutable, one for each raw action in the process
+    _actions: Dict[str, "Action"] = dict()
+
+    @classmethod
+    def of(cls, raw_action: str) -> "Action":
+        if (action := cls._actions.get(raw_action)) is None:
+            action = cls._actions.setdefault(raw_action, cls(raw_action))
+        return action
+
     def __init__(self, raw_action):
+        self.raw = raw_action
         self.name = "UNKNOWN_ACTION[{}]".format(raw_action)
         self.args = "???"
-        if (m := PREDICATE.search(raw_action)) is not None:
-            self.name = m.group("name")
-            self.args = m.group("args")
+        self.arguments: Tuple[str, ...] = ()
+        (name, arguments) = parse_term(raw_action)
+        if arguments:
+            self.name = name
+            self.args = ",".join(arguments)
+            self.arguments = arguments
 
     def __repr__(self):
         return "{}({})".format(self.name, self.args)
@@ -43,6 +49,8 @@ class Action:
 
 
 class Agent:
+    __slots__ = ["name"]
+
     def __init__(self, name):
         self.name = name
 
@@ -56,116 +64,240 @@ class Agent:
         return hash(self.name)
 
 
+class Timeline:
+    """Symbols at each time step, as sorted arrays of their `SYMBOLS` ids."""
+
+    __slots__ = ["steps"]
+
+    def __init__(self, length: int, timed_symbols: Iterable[Tuple[int, Hashable]]):
+        steps: List[Set[int]] = [set() for _ in range(length)]
+        for (t, symbol) in timed_symbols:
+            steps[t].add(SYMBOLS.id(symbol))
+        self.steps = [array("i", sorted(ids)) for ids in steps]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __getitem__(self, t: int) -> List[Hashable]:
+        names = SYMBOLS.names
+        return [names[i] for i in self.steps[t]]
+
+    def is_empty(self) -> bool:
+        return not any(self.steps)
+
+
 class StripsValidator(Validator):
-    def __init__(self, solution):
-        super().__init__(solution)
+    __slots__ = [
+        "time",
+        "max_time",
+        "agents",
+        "default_agent",
+        "actions",
+        "declared_actions",
+        "fluents",
+        "start",
+        "goal",
+        "parsed_execs",
+        "parsed_holds",
+        "simulator",
+        "execs",
+        "holds",
+        "built_plan",
+    ]
 
-        # Parse time first to use time as dictionary keys
+    # Domains that check the goal on their own state can skip the simulator's.
+    SIMULATE_GOAL = True
+    STATIC_ATTRIBUTES = [
+        "time",
+        "max_time",
+        "agents",
+        "actions",
+        "declared_actions",
+        "fluents",
+        "start",
+        "goal",
+        "simulator",
+    ]
+
+    def __init__(self, solution, context=None):
         self.time: Set[int] = set()
         self.max_time = -1
 
         self.agents: Dict[str, Agent] = dict()
-        for pred in self.solution:
-            skipped = False
-            if (m := AGENT.search(pred)) is not None:
-                agent_name = m.group("agent")
-                self.agents[agent_name] = Agent(agent_name)
-                self.parsed_predicates.add(pred)
-            else:
-                skipped = True
-            if not skipped:
-                self.parsed_predicates.add(pred)
-
         self.default_agent: Optional[Agent] = None
+
+        self.actions: Set[str] = set()
+        # Actions as they're printed in `exec`, `agent_action` for action/2
+        self.declared_actions: Set[str] = set()
+        self.fluents: Set[str] = set()
+        self.start: List[str] = []
+        self.goal: List[str] = []
+
+        # `exec` and `holds` need all the times and agents, they're added to
+        # `execs` and `holds` once everything is parsed.
+        self.parsed_execs: List[Tuple[int, Optional[str], str]] = []
+        self.parsed_holds: List[Tuple[int, str]] = []
+
+        # Preconditions and effects from action_ppre/npre/add/del
+        self.simulator = StripsSimulator()
+
+        super().__init__(solution, context)
+
         if len(self.agents) == 0:
             self.agents["defaultAgent"] = Agent("defaultAgent")
 
-        for pred in self.solution:
-            skipped = False
-            if (m := TIME.search(pred)) is not None:
-                t = int(m.group("t"))
-                self.time.add(t)
-                if t > self.max_time:
-                    self.max_time = t
-                self.parsed_predicates.add(pred)
-            else:
-                skipped = True
-            if not skipped:
-                self.parsed_predicates.add(pred)
-
-        # Parse everything
-        # In python `exec` is a reserved keyword, so we use `plan` instead.
-        self.plan: List[Dict[Agent, Set[Action]]] = [
-            {agent: set() for agent in self.agents.values()} for _ in self.time
-        ]
+        # `(agent_name, raw_action)` executed at each time
+        executions = []
+        for (time, agent_name, raw_action) in self.parsed_execs:
+            if agent_name is None:
+                agent_name = "defaultAgent"
+            if agent_name not in self.agents:
+                raise KeyError(agent_name)
+            executions.append((time, (agent_name, raw_action)))
+        self.execs = Timeline(len(self.time), executions)
 
         # Add the extra time unit for `holds`
         self.time.add(self.max_time + 1)
 
-        self.actions: Set[str] = set()
-        self.fluents: Set[str] = set()
-        self.holds: List[Set[str]] = [set() for _ in self.time]
-        self.start: List[str] = []
-        self.goal: List[str] = []
+        self.holds = Timeline(len(self.time), self.parsed_holds)
+        # Built on the first use of `plan`
+        self.built_plan: Optional[List[Dict[Agent, Set[Action]]]] = None
+
+        # Only the ids are kept
+        self.parsed_execs = []
+        self.parsed_holds = []
+
+    @property
+    def plan(self) -> List[Dict[Agent, Set[Action]]]:
+        """Actions of each agent at each time, built from `execs` on first use.
+
+        In python `exec` is a reserved keyword, so we use `plan` instead.
+        """
+        if self.built_plan is None:
+            self.built_plan = [
+                {agent: set() for agent in self.agents.values()}
+                for _ in range(len(self.execs))
+            ]
+            for (t, instant_plan) in enumerate(self.built_plan):
+                for (agent_name, raw_action) in self.execs[t]:
+                    instant_plan[self.agents[agent_name]].add(Action.of(raw_action))
+        return self.built_plan
+
+    @handles("agent", 1, static=True)
+    def parse_agent(self, agent_name):
+        self.agents[agent_name] = Agent(agent_name)
+
+    @handles("time", 1, static=True)
+    def parse_time(self, t):
+        if not t.isdigit():
+            return False
+        t = int(t)
+        self.time.add(t)
+        if t > self.max_time:
+            self.max_time = t
+
+    @handles("fluent", static=True)
+    def parse_fluent(self, *f):
+        self.fluents.add(",".join(f))
+
+    @handles("action", static=True)
+    def parse_action(self, *action):
+        self.actions.add(",".join(action))
+        self.declared_actions.add(agent_action(*action))
+
+    # fluent_dropped(T, F) changes with the plan, it's not static
+    @handles("fluent_dropped")
+    def parse_ignored(self, *_args):
+        pass
+
+    @handles(PPRE, 2, static=True)
+    @handles(PPRE, 3, static=True)
+    def parse_ppre(self, *definition):
+        self.parse_definition(PPRE, *definition)
 
-        for pred in self.solution:
-            skipped = False
-            if (m := TIME.search(pred)) is not None:
-                pass
-            elif (m := AGENT.search(pred)) is not None:
-                pass
-            elif (m := FLUENT.search(pred)) is not None:
-                f = m.group("f")
-                self.fluents.add(f)
-            elif (m := FLUENT_DROPPED.search(pred)) is not None:
-                pass
-            elif (m := ACTION.search(pred)) is not None:
-                self.actions.add(m.group("action"))
-            elif (m := ACTION_PPRE.search(pred)) is not None:
-                pass
-            elif (m := ACTION_NPRE.search(pred)) is not None:
-                pass
-            elif (m := ACTION_ADD.search(pred)) is not None:
-                pass
-            elif (m := ACTION_DEL.search(pred)) is not None:
-                pass
-            elif (m := START.search(pred)) is not None:
-                f = m.group("f")
-                self.start.append(f)
-            elif (m := GOAL.search(pred)) is not None:
-                f = m.group("f")
-                self.goal.append(f)
-            elif (m := EXEC_MULTI.search(pred)) is not None:
-                agent = self.agents[m.group("agent")]
-                time = int(m.group("time"))
-                action = Action(m.group("action"))
-                self.plan[time][agent].add(action)
-            elif (m := EXEC_SINGLE.search(pred)) is not None:
-                agent = self.agents["defaultAgent"]
-                time = int(m.group("time"))
-                action = Action(m.group("action"))
-                self.plan[time][agent].add(action)
-            elif (m := HOLDS.search(pred)) is not None:
-                t = int(m.group("t"))
-                f = m.group("f")
-                self.holds[t].add(f)
-            else:
-                skipped = True
-            if not skipped:
-                self.parsed_predicates.add(pred)
+    @handles(NPRE, 2, static=True)
+    @handles(NPRE, 3, static=True)
+    def parse_npre(self, *definition):
+        self.parse_definition(NPRE, *definition)
+
+    @handles(ADD, 2, static=True)
+    @handles(ADD, 3, static=True)
+    def parse_add(self, *definition):
+        self.parse_definition(ADD, *definition)
+
+    @handles(DEL, 2, static=True)
+    @handles(DEL, 3, static=True)
+    def parse_del(self, *definition):
+        self.parse_definition(DEL, *definition)
+
+    def parse_definition(self, kind, *definition):
+        # action_add(A, F) or action_add(Agent, A, F)
+        *action, fluent = definition
+        self.simulator.define(kind, agent_action(*action), fluent)
+
+    @handles("start", static=True)
+    def parse_start(self, *f):
+        self.start.append(",".join(f))
+
+    @handles("goal", static=True)
+    def parse_goal(self, *f):
+        self.goal.append(",".join(f))
+
+    @handles("exec", 2)
+    def parse_exec(self, time, action):
+        if not time.isdigit():
+            return False
+        self.parsed_execs.append((int(time), None, action))
+
+    @handles("exec", 3)
+    def parse_exec_multi(self, time, agent_name, action):
+        if not time.isdigit():
+            return False
+        self.parsed_execs.append((int(time), agent_name, action))
+
+    @handles("holds", 2)
+    def parse_holds(self, t, f):
+        if not t.isdigit():
+            return False
+        self.parsed_holds.append((int(t), f))
 
     def verify(self):
         logs = super().verify()
 
         if len(self.time) == 0:
             logs.append((LogLevel.WARNING, "No time defined!"))
-        if len(self.plan) == 0:
+        if len(self.execs) == 0:
             logs.append(
                 (LogLevel.WARNING, "Empty plan, No actions executed (`exec` is empty).")
             )
 
+        # Without action definitions (e.g. not shown) domains check on their own.
+        if len(self.simulator) > 0:
+            logs += self.simulator.simulate(
+                self.start,
+                self.simulated_plan(),
+                self.goal,
+                holds=None if self.holds.is_empty() else self.holds,
+                declared_actions=self.declared_actions,
+                check_goal=self.SIMULATE_GOAL,
+            )
+
         return logs
 
+    def simulated_plan(self) -> List[List[Tuple[str, str]]]:
+        """`(agent_name, action)` executed at each time, as the simulator names them."""
+        plan = []
+        for instant_plan in self.plan:
+            executed = []
+            for agent, actions in instant_plan.items():
+                for action in sorted(actions, key=lambda a: a.raw):
+                    name = agent_action(agent.name, action.raw)
+                    if not self.simulator.has_action(name):
+                        name = action.raw
+                    executed.append((agent.name, name))
+            plan.append(executed)
+        return plan
+
     def instance_summary(self, sep=", "):
         return "Plan: [{}]".format(
             sep.join(["{}: {}".format(t, str(i_p)) for t, i_p in enumerate(self.plan)]),
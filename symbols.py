@@ -0,0 +1,78 @@
+import sys
+import threading
+
+from typing import Dict, Hashable, Iterable, List
+
+
+class Interner:
+    """Dense integer ids for names, in order of appearance.
+
+    Sets of names are kept as bitsets, python ints with the bit of each id.
+    """
+
+    __slots__ = ["ids", "names", "lock"]
+
+    def __init__(self):
+        self.ids: Dict[Hashable, int] = dict()
+        self.names: List[Hashable] = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __copy__(self):
+        interner = Interner()
+        interner.ids = dict(self.ids)
+        interner.names = list(self.names)
+        return interner
+
+    def __getstate__(self):
+        return (self.ids, self.names)
+
+    def __setstate__(self, state):
+        (self.ids, self.names) = state
+        self.lock = threading.Lock()
+
+    def id(self, name: Hashable) -> int:
+        if (name_id := self.ids.get(name)) is not None:
+            return name_id
+        with self.lock:
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+            return self.ids[name]
+
+    def bit(self, name: str) -> int:
+        return 1 << self.id(name)
+
+    def mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            mask |= self.bit(name)
+        return mask
+
+    def known_mask(self, names: Iterable[str]) -> int:
+        """Same as `mask`, but ignoring names without an id."""
+        mask = 0
+        for name in names:
+            if name in self.ids:
+                mask |= 1 << self.ids[name]
+        return mask
+
+    def unmask(self, mask: int) -> List[str]:
+        # Bits are only set from `bit` and `mask`, on names that are strings
+        names = []
+        while mask:
+            low = mask & -mask
+            names.append(str(self.names[low.bit_length() - 1]))
+            mask ^= low
+        return names
+
+
+# Atoms and terms of every validated model, shared by the whole process
+SYMBOLS = Interner()
+
+
+def intern_atoms(atoms: Iterable[str]) -> List[str]:
+    """The atoms of a model, with a single copy of each string in the process."""
+    return [sys.intern(atom) for atom in atoms]
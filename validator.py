@@ -1,24 +1,239 @@
+import copy
 import re
 
 from enum import Enum
-from logging import LogLevel
+from log import LogLevel
 from termcolor import colored
-from typing import Dict, List, Tuple, Set, Optional
+from typing import Any, Callable, Dict, List, Tuple, Set, Optional
 
 
 PREDICATE = re.compile(r"^(?P<name>\w+)\((?P<args>.*)\)$")
+# Arities of the atoms shown for the handlers of any arity
+SHOWN_ARITIES = [1, 2, 3]
+
+
+def split_args(args: str) -> Tuple[str, ...]:
+    """Splits `a,f(b,c),"d,e"` into `("a", "f(b,c)", "\"d,e\"")`."""
+    if "(" not in args and '"' not in args:
+        return tuple(args.split(","))
+
+    parts = []
+    depth = 0
+    quoted = False
+    escaped = False
+    start = 0
+    for i, c in enumerate(args):
+        if quoted:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                quoted = False
+        elif c == '"':
+            quoted = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(args[start:i])
+            start = i + 1
+    parts.append(args[start:])
+    return tuple(parts)
+
+
+def parse_term(term: str) -> Tuple[str, Tuple[str, ...]]:
+    """Splits an atom like `holds(0,on(a,b))` into `("holds", ("0", "on(a,b)"))`.
+
+    Constants like `wait` have no arguments. Arguments are kept as they're
+    printed by clingo, without spaces.
+    """
+    open_at = term.find("(")
+    if open_at <= 0 or term[-1] != ")" or open_at == len(term) - 2:
+        return (term, ())
+    return (term[:open_at], split_args(term[open_at + 1 : -1]))
+
+
+def handles(name: str, arity: Optional[int] = None, static: bool = False):
+    """Registers a `Validator` method as the handler of `name/arity` atoms.
+
+    The method gets the arguments of each atom as strings, without arity it
+    gets them all, e.g. `action_add/2` and `action_add/3`. Returning `False`
+    leaves the atom as not recognized. A method can handle several predicates.
+
+    Static handlers only fill the class' `STATIC_ATTRIBUTES`, from atoms of
+    the instance that all the models of a test share (see `ValidationContext`).
+    """
+
+    def register(method):
+        method.handles = getattr(method, "handles", []) + [(name, arity)]
+        method.static = getattr(method, "static", False) or static
+        return method
+
+    return register
+
+
+def find_handler(
+    table: Dict[Tuple[str, Optional[int]], Callable], name: str, args: Tuple[str, ...]
+) -> Optional[Callable]:
+    handler = table.get((name, len(args)))
+    if handler is None:
+        handler = table.get((name, None))
+    return handler
+
+
+def validated(cls, context: Optional["ValidationContext"], solution: List[str]):
+    v = cls(solution, context)
+    v.is_valid()
+    return v
+
+
+class ValidationContext:
+    """The static atoms shared by all the models of a test, parsed once.
+
+    The atoms in every model with a static handler (e.g. `block/1`) are parsed
+    by a validator of their own, and the `STATIC_ATTRIBUTES` it has right
+    after parsing are kept. Each model starts from a shallow copy of them and
+    only parses the rest of its atoms, shared atoms with other handlers (e.g.
+    `holds(0,...)`) are split once too.
+    """
+
+    def __init__(self, validator_class, solutions: List[List[str]]):
+        self.table = validator_class.handler_table()
+
+        shared = set(solutions[0]).intersection(*solutions[1:])
+        self.atoms = frozenset(shared)
+        # Split shared atoms with dynamic handlers
+        self.terms: List[Tuple[str, Callable, Tuple[str, ...]]] = []
+        # Shared atoms that aren't recognized
+        self.unparsed: List[str] = []
+        static_atoms = []
+        for pred in solutions[0]:
+            if pred not in shared:
+                continue
+            (name, args) = parse_term(pred)
+            handler = find_handler(self.table, name, args)
+            if handler is None:
+                self.unparsed.append(pred)
+            elif getattr(handler, "static", False):
+                static_atoms.append(pred)
+            else:
+                self.terms.append((pred, handler, args))
+
+        self.state: Optional[Dict[str, Any]] = None
+        validator_class(static_atoms, self)
+
+    def capture(self, validator: "Validator"):
+        self.state = {
+            attr: copy.copy(getattr(validator, attr))
+            for attr in validator.STATIC_ATTRIBUTES
+        }
+        self.unparsed += validator.unparsed
+
+    def restore(self, validator: "Validator"):
+        # Only called once `capture` kept the state
+        assert self.state is not None
+        for (attr, value) in self.state.items():
+            setattr(validator, attr, copy.copy(value))
+
+    def split(self, solution: List[str]):
+        """The atoms of `solution` left to parse, `None` if its static atoms differ."""
+        terms: List[Tuple[str, Optional[Callable], Tuple[str, ...]]] = list(self.terms)
+        for pred in solution:
+            if pred in self.atoms:
+                continue
+            (name, args) = parse_term(pred)
+            handler = find_handler(self.table, name, args)
+            if handler is not None and getattr(handler, "static", False):
+                return None
+            terms.append((pred, handler, args))
+        return terms
 
 
 class Validator:
-    def __init__(self, solution: List[str]):
+    __slots__ = ["solution", "unparsed", "valid", "logs", "context"]
+
+    # Handlers of each validator class, by (name, arity)
+    _handler_tables: Dict[type, Dict[Tuple[str, Optional[int]], Callable]] = dict()
+    # Attributes filled by static handlers, and nothing else while parsing
+    STATIC_ATTRIBUTES: List[str] = []
+
+    def __init__(
+        self, solution: List[str], context: Optional[ValidationContext] = None
+    ):
         # All predicates from the model
         self.solution = solution
-        # All predicates that have been recognized
-        self.parsed_predicates: Set[str] = set()
+        # All predicates that haven't been recognized, usually a few
+        self.unparsed: List[str] = []
 
         self.valid: Optional[bool] = None
         self.logs: List[Tuple[LogLevel, str]] = []
 
+        # Static atoms recognized by the context
+        self.context: Optional[ValidationContext] = None
+        if context is None:
+            self.parse()
+        elif context.state is None:
+            # Parsing the static atoms for the context itself
+            self.parse()
+            context.capture(self)
+        elif (terms := context.split(solution)) is None:
+            self.parse()
+        else:
+            self.context = context
+            context.restore(self)
+            self.parse_terms(terms)
+
+    @classmethod
+    def batch(cls, solutions: List[List[str]]) -> List["Validator"]:
+        """Validators of several models of one test, sharing their static atoms.
+
+        They're validated one after the other, validation is pure python and
+        holds the GIL, threads only add overhead.
+        """
+        context = ValidationContext(cls, solutions) if len(solutions) > 1 else None
+        return [validated(cls, context, solution) for solution in solutions]
+
+    @classmethod
+    def handler_table(cls) -> Dict[Tuple[str, Optional[int]], Callable]:
+        """The `@handles` methods of the class, subclasses override their parents."""
+        if cls not in Validator._handler_tables:
+            table = dict()
+            for klass in reversed(cls.__mro__):
+                for method in vars(klass).values():
+                    for predicate in getattr(method, "handles", []):
+                        table[predicate] = method
+            Validator._handler_tables[cls] = table
+        return Validator._handler_tables[cls]
+
+    @classmethod
+    def shown_predicates(cls) -> List[Tuple[str, int]]:
+        """`(name, arity)` of the atoms the handlers consume, to show only those."""
+        predicates: Set[Tuple[str, int]] = set()
+        for (name, arity) in cls.handler_table():
+            arities = SHOWN_ARITIES if arity is None else [arity]
+            predicates.update((name, a) for a in arities)
+        return sorted(predicates)
+
+    def parse(self):
+        """Sends each atom of the solution to its handler, in a single pass.
+
+        Subclasses set up their attributes before calling `super().__init__`,
+        and finish what depends on several atoms after it.
+        """
+        table = self.handler_table()
+        for pred in self.solution:
+            (name, args) = parse_term(pred)
+            handler = find_handler(table, name, args)
+            if handler is None or handler(self, *args) is False:
+                self.unparsed.append(pred)
+
+    def parse_terms(self, terms: List[Tuple[str, Optional[Callable], Tuple[str, ...]]]):
+        for (pred, handler, args) in terms:
+            if handler is None or handler(self, *args) is False:
+                self.unparsed.append(pred)
+
     def __str__(self) -> str:
         if self.valid is None:
             return "Validator[(Uninitialized)]"
@@ -47,10 +262,12 @@ class Validator:
 
         self.logs = self.verify()
 
+        unparsed = self.unparsed
+        if self.context is not None:
+            unparsed = self.context.unparsed + unparsed
+
         ignored_predicates = set()
-        for pred in self.solution:
-            if pred in self.parsed_predicates:
-                continue
+        for pred in unparsed:
             if (m := PREDICATE.search(pred)) is not None:
                 predicate_name = m.group("name")
                 ignored_predicates.add(predicate_name)
@@ -81,7 +298,9 @@ class Validator:
             try:
                 self.validate()
             except Exception as e:
-                self.logs.append((LogLevel.WARNING, "Validator failed with {}".format(e)))
+                self.logs.append(
+                    (LogLevel.WARNING, "Validator failed with {}".format(e))
+                )
                 print("Can't' parse solution:")
                 print("  * " + "\n  * ".join(self.solution))
                 self.valid = None